@@ -2,8 +2,9 @@ import asyncio
 from server import Server
 from settings import Settings
 from controller import Controller
-import ujson as json
 from logger import Logger
+from flash_log import FlashLog
+from history import History
 from utils import millis
 import sys
 
@@ -12,8 +13,23 @@ log = Logger("app")
 
 async def main():
     settings = Settings()
+    flash_log = FlashLog(
+        files=settings.log.FlashLogFiles,
+        file_size=settings.log.FlashLogFileSizeInKB * 1024,
+        flush_interval=settings.log.FlashLogFlushInterval,
+    )
+    log.set_flash_log(flash_log)
+    flash_log.start()
     controller = Controller()
-    server = Server(controller)
+    controller.restore()
+    history = History(
+        settings.ui.HistorySize,
+        rollups=(
+            (10_000, settings.ui.History10sSize),
+            (60_000, settings.ui.History60sSize),
+        ),
+    )
+    server = Server(controller, history=history)
     server_task = asyncio.create_task(server.start_server())
 
     while True:
@@ -21,7 +37,9 @@ async def main():
 
         controller.loop()
 
-        await server.push(json.dumps(controller.info()))
+        info = controller.info()
+        history.record(info)
+        server.push(info)
 
         loop_time = (millis() - start) / 1000.0
         if loop_time < settings.ui.Refresh:
@@ -45,6 +63,7 @@ def run():
         sys.print_exception(e)
     finally:
         log.info("Exiting...")
+        log.set_flash_log(None)  # flush whatever is still buffered
 
 
 if __name__ == "__main__":
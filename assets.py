@@ -0,0 +1,206 @@
+import binascii
+import hashlib
+import os
+import ujson as json
+from logger import Logger
+
+log = Logger(__name__)
+
+HASH_LENGTH = 16  # hex digits of the SHA-256 kept for an ETag
+
+
+def file_hash(path: str, buffer: bytearray = None) -> str:
+    """Short content hash of a file, the same on the device and the host"""
+    buffer = buffer or bytearray(512)
+    view = memoryview(buffer)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            n = file.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return binascii.hexlify(digest.digest())[:HASH_LENGTH].decode()
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows a gzip response"""
+    if not accept_encoding:
+        return False
+    for coding in accept_encoding.split(","):
+        params = coding.split(";")
+        name = params[0].strip().lower()
+        if name not in ("gzip", "*"):
+            continue
+        for param in params[1:]:
+            param = param.strip()
+            if param.startswith("q=") and param[2:].strip("0.") == "":
+                break  # q=0, q=0.0 etc. mean not acceptable
+        else:
+            return True
+    return False
+
+
+class Assets:
+    """Manifest of content hashes and sizes for the static files.
+
+    Hashes are kept in a small JSON file together with the size and mtime
+    they were computed for, so a restart only hashes the files that changed.
+    The manifest also tells which files have a precompressed .gz variant,
+    so picking what to serve never needs a failed open().
+
+    Files up to `cache_max_file` bytes are kept in RAM once read, up to
+    `cache_size` bytes in total, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        directory: str = "static",
+        path: str = "assets.json",
+        cache_size: int = 0,
+        cache_max_file: int = 8192,
+    ):
+        self.directory = directory
+        self.path = path
+        self.files = {}  # file path -> [etag, size, mtime]
+        self.buffer = bytearray(512)
+        self.cache_size = cache_size
+        self.cache_max_file = cache_max_file
+        self.cache = {}  # file path -> bytearray
+        self.lru = []  # cached file paths, least recently used first
+        self.cached = 0  # bytes
+        self.hits = 0
+        self.misses = 0
+        self.load()
+        self.scan()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                self.files = json.load(file)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def save(self):
+        try:
+            with open(self.path, "w") as file:
+                json.dump(self.files, file)
+        except OSError as e:
+            log.error(f"Error writing asset manifest: {e}")
+
+    def scan(self):
+        """Bring the manifest up to date with the static directory"""
+        changed = False
+        seen = set()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for name in names:
+            path = f"{self.directory}/{name}"
+            seen.add(path)
+            changed = self.refresh(path) or changed
+        for path in list(self.files):
+            if path not in seen:
+                del self.files[path]
+                changed = True
+        if changed:
+            self.save()
+        gzipped = len([p for p in self.files if p.endswith(".gz")])
+        log.info(f"{len(self.files)} static files ({gzipped} gzipped) in the manifest")
+
+    def refresh(self, path: str, force: bool = False) -> bool:
+        """Rehash a file if it changed since it was last hashed"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat[0] & 0x4000:  # a directory
+            return False
+        size = stat[6]
+        mtime = stat[8]
+        entry = self.files.get(path)
+        if not force and entry and entry[1] == size and entry[2] == mtime:
+            return False
+        self.files[path] = [file_hash(path, self.buffer), size, mtime]
+        return True
+
+    def contains(self, path: str) -> bool:
+        return path.startswith(self.directory + "/")
+
+    def update(self, path: str):
+        """A static file was written, e.g. by an upload"""
+        # mtimes can be as coarse as seconds, hash again regardless
+        self.evict(path)
+        if self.contains(path) and self.refresh(path, force=True):
+            self.save()
+
+    def remove(self, path: str):
+        path = path.lstrip("/")
+        self.evict(path)
+        if self.files.pop(path, None) is not None:
+            self.save()
+
+    def read(self, path: str) -> memoryview | None:
+        """Contents of a small static file from RAM, or None if the file is
+        not cacheable and has to be streamed from flash
+        """
+        data = self.cache.get(path)
+        if data is not None:
+            self.hits += 1
+            self.lru.remove(path)
+            self.lru.append(path)
+            return memoryview(data)
+        entry = self.files.get(path)
+        if entry is None or entry[1] > min(self.cache_max_file, self.cache_size):
+            return None
+        self.misses += 1
+        data = bytearray(entry[1])
+        try:
+            with open(path, "rb") as file:
+                if file.readinto(data) != len(data):
+                    return None  # changed behind our back
+        except OSError:
+            return None
+        while self.cached + len(data) > self.cache_size:
+            self.evict(self.lru[0])
+        self.cache[path] = data
+        self.lru.append(path)
+        self.cached += len(data)
+        return memoryview(data)
+
+    def evict(self, path: str):
+        data = self.cache.pop(path, None)
+        if data is not None:
+            self.lru.remove(path)
+            self.cached -= len(data)
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.files),
+            "cached": len(self.cache),
+            "cached_bytes": self.cached,
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def has_gzip(self, path: str) -> bool:
+        return path + ".gz" in self.files
+
+    def select(self, path: str, gzip: bool) -> str | None:
+        """The file to serve for `path`, the smallest representation the
+        client accepts, or None when the only one is gzip and it is not
+        accepted. Paths outside the manifest are returned unchanged.
+        """
+        plain = self.files.get(path)
+        packed = self.files.get(path + ".gz")
+        if packed and gzip and (plain is None or packed[1] < plain[1]):
+            return path + ".gz"
+        if plain or not packed:
+            return path
+        return None
+
+    def etag(self, path: str) -> str | None:
+        entry = self.files.get(path)
+        return entry[0] if entry else None
@@ -0,0 +1,126 @@
+# Stress the web server with many concurrent local clients while a control
+# loop ticks, with and without admission control. Reports control tick
+# jitter, the peak number of connections served at once and the responses
+import asyncio
+from timing import micros, report
+
+from microdot import Microdot
+
+PORT = 5081
+TICK = 50_000  # us, the control loop period
+DURATION = 3  # s
+CLIENTS = 40  # clients requesting as fast as they can
+SLOW_CLIENTS = 10  # clients trickling their headers in
+IDLE_CLIENTS = 10  # clients connecting and sending nothing
+
+
+
+def make_app():
+    app = Microdot()
+
+    @app.get("/")
+    async def index(request):
+        return "hello"
+
+    @app.get("/slow")
+    async def slow(request):
+        await asyncio.sleep(0.2)  # e.g. reading flash
+        return "slow"
+
+    return app
+
+
+async def control_loop(app, stats):
+    next_tick = micros() + TICK
+    while not stats["done"]:
+        await asyncio.sleep((next_tick - micros()) / 1_000_000)
+        late = micros() - next_tick
+        stats["jitter"].append(max(0, late))
+        stats["peak"] = max(stats["peak"], app.connections)
+        next_tick += TICK
+
+
+async def connection(stats, session):
+    while not stats["done"]:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            status = await session(reader, writer)
+        except (OSError, IndexError):
+            status = "error"
+            await asyncio.sleep(0.1)
+        finally:
+            if writer:
+                writer.close()
+        stats[status] = stats.get(status, 0) + 1
+
+
+def client(path):
+    async def session(reader, writer):
+        writer.write(f"GET {path} HTTP/1.0\r\n\r\n".encode())
+        await writer.drain()
+        status = (await reader.readline()).split(b" ")[1].decode()
+        await reader.read()
+        return status
+
+    return session
+
+
+async def slow_client(reader, writer):
+    for c in "GET / HTTP/1.0\r\nX-Slow: 1\r\n\r\n":
+        writer.write(c.encode())
+        await writer.drain()
+        await asyncio.sleep(0.5)
+    line = await reader.readline()
+    await reader.read()
+    return "slow " + (line.split(b" ")[1].decode() if line else "dropped")
+
+
+async def idle_client(reader, writer):
+    line = await reader.readline()  # until the server gives up on us
+    await reader.read()
+    return "idle " + (line.split(b" ")[1].decode() if line else "dropped")
+
+
+async def run(name, app):
+    server = asyncio.create_task(app.start_server(port=PORT))
+    await asyncio.sleep(0.1)
+    stats = {"done": False, "jitter": [], "peak": 0}
+    sessions = [client("/slow" if i % 4 == 0 else "/") for i in range(CLIENTS)]
+    sessions += [slow_client] * SLOW_CLIENTS + [idle_client] * IDLE_CLIENTS
+    tasks = [asyncio.create_task(control_loop(app, stats))]
+    tasks += [asyncio.create_task(connection(stats, s)) for s in sessions]
+    await asyncio.sleep(DURATION)
+    stats["done"] = True
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    while app.connections:
+        await asyncio.sleep(0.1)  # let the server side of each socket finish
+    app.shutdown()
+    await asyncio.gather(server, return_exceptions=True)
+
+    jitter = sorted(stats.pop("jitter"))
+    stats.pop("done")
+    report(
+        name,
+        ticks=len(jitter),
+        jitter_p99_ms=jitter[len(jitter) * 99 // 100] / 1000,
+        jitter_max_ms=jitter[-1] / 1000,
+        **stats,
+    )
+
+
+async def main():
+    app = make_app()
+    app.header_timeout = 60
+    await run("unlimited", app)
+    app = make_app()
+    app.max_connections = 8
+    app.connection_queue_timeout = 0.5
+    app.header_timeout = 1
+    app.request_timeout = 1
+    await run("admission control", app)
+
+
+asyncio.run(main())
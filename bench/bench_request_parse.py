@@ -0,0 +1,143 @@
+# Request parsing: every header line decoded, split and stored in a dict up
+# front vs raw header lines decoded only when a handler asks for them.
+# Reports requests parsed per second and the heap kept alive per request
+import asyncio
+from timing import micros, elapsed, report
+
+from microdot import Microdot, Request
+from microdot.microdot import NoCaseDict
+
+try:
+    import tracemalloc
+except ImportError:  # MicroPython
+    tracemalloc = None
+
+BROWSER_GET = (
+    b"GET /static/app.js?v=3f2a9c0d1e4b5a67 HTTP/1.1\r\n"
+    b"Host: 192.168.4.1\r\n"
+    b"Connection: keep-alive\r\n"
+    b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    b"(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36\r\n"
+    b"Accept: */*\r\n"
+    b"Referer: http://192.168.4.1/\r\n"
+    b"Accept-Encoding: gzip, deflate\r\n"
+    b"Accept-Language: en-GB,en;q=0.9\r\n"
+    b"Cookie: session=abc123; theme=dark\r\n"
+    b"If-None-Match: \"3f2a9c0d1e4b5a67\"\r\n"
+    b"Cache-Control: max-age=0\r\n"
+    b"Sec-Fetch-Mode: no-cors\r\n"
+    b"Sec-Fetch-Dest: script\r\n"
+    b"\r\n"
+)
+ITERATIONS = 2000
+KEPT = 200
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    async def readline(self):
+        end = self.data.find(b"\n", self.offset) + 1 or len(self.data)
+        line = self.data[self.offset:end]
+        self.offset = end
+        return line
+
+    async def readexactly(self, n):
+        data = self.data[self.offset:self.offset + n]
+        self.offset += n
+        return data
+
+
+async def old_create(app, client_reader, client_writer, client_addr):
+    # Request.create before header parsing was deferred, together with the
+    # cookie and content type parsing Request.__init__ used to do
+    line = (await Request._safe_readline(client_reader)).strip().decode()
+    method, url, http_version = line.split()
+    http_version = http_version.split("/", 1)[1]
+    headers = NoCaseDict()
+    content_length = 0
+    while True:
+        line = (await Request._safe_readline(client_reader)).strip().decode()
+        if line == "":
+            break
+        header, value = line.split(":", 1)
+        value = value.strip()
+        headers[header] = value
+        if header.lower() == "content-length":
+            content_length = int(value)
+    body = b""
+    if content_length and content_length <= Request.max_body_length:
+        body = await client_reader.readexactly(content_length)
+    request = Request(app, client_addr, method, url, http_version, headers, body=body)
+    request.content_type = headers.get("Content-Type")
+    cookies = {}
+    for cookie in headers.get("Cookie", "").split(";"):
+        if cookie:
+            name, value = cookie.strip().split("=", 1)
+            cookies[name] = value
+    request.cookies = cookies
+    return request
+
+
+def handler(request):
+    # what the static route looks at
+    return request.header("Accept-Encoding"), request.header("If-None-Match")
+
+
+def old_handler(request):
+    return request.headers.get("Accept-Encoding"), request.headers.get("If-None-Match")
+
+
+async def parse(create, app, count, keep=None):
+    for _ in range(count):
+        request = await create(app, Reader(BROWSER_GET), None, None)
+        if keep is not None:
+            keep.append(request)
+
+
+async def retained(create, app, look):
+    # heap held by live requests, as with a few concurrent connections
+    keep = []
+    if tracemalloc is None:
+        import gc
+
+        gc.collect()
+        before = gc.mem_alloc()
+        await parse(create, app, KEPT, keep)
+        for request in keep:
+            look(request)
+        gc.collect()
+        return (gc.mem_alloc() - before) // KEPT
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await parse(create, app, KEPT, keep)
+    for request in keep:
+        look(request)
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return total // KEPT
+
+
+async def main():
+    app = Microdot()
+    for name, create, look in (
+        ("eager", old_create, old_handler),
+        ("lazy", Request.create, handler),
+        ("lazy, headers used", Request.create, old_handler),
+    ):
+        await parse(create, app, 100)
+        start = micros()
+        for _ in range(ITERATIONS):
+            look(await create(app, Reader(BROWSER_GET), None, None))
+        t = elapsed(start) / ITERATIONS
+        report(
+            name,
+            us_per_request=t,
+            requests_s=1_000_000 / t,
+            bytes_per_request=await retained(create, app, look),
+        )
+
+
+asyncio.run(main())
@@ -0,0 +1,94 @@
+# Response writes: one awrite() per header vs headers (and a small body) in
+# one write. Each awrite() on a socket is a send() and, on lwIP, usually a
+# TCP segment of its own
+import asyncio
+import os
+from timing import micros, elapsed, report
+
+from microdot import Response, send_file
+from microdot.microdot import MUTED_SOCKET_ERRORS
+
+
+class Stream:
+    def __init__(self):
+        self.writes = 0
+        self.size = 0
+
+    async def awrite(self, data):
+        self.writes += 1
+        self.size += len(data)
+
+
+async def old_write(self, stream):
+    # Response.write before headers were coalesced
+    self.complete()
+    reason = self.reason if self.reason is not None else (
+        "OK" if self.status_code == 200 else "N/A"
+    )
+    await stream.awrite(
+        "HTTP/1.1 {status_code} {reason}\r\n".format(
+            status_code=self.status_code, reason=reason
+        ).encode()
+    )
+    for header, value in self.headers.items():
+        values = value if isinstance(value, list) else [value]
+        for value in values:
+            await stream.awrite(
+                "{header}: {value}\r\n".format(header=header, value=value).encode()
+            )
+    await stream.awrite(b"\r\n")
+    iter = self.body_iter()
+    async for body in iter:
+        try:
+            await stream.awrite(body)
+        except OSError as exc:
+            if exc.errno not in MUTED_SOCKET_ERRORS:
+                raise
+    await iter.aclose()
+
+
+def sample(size):
+    path = f"/tmp/bench_response_{size}.js"
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+    return path
+
+
+RESPONSES = (
+    ("json 60 B", lambda: Response({"temp": 1043.2, "target": 1050.0})),
+    ("204", lambda: Response(None)),
+    ("404", lambda: Response("Not found", 404)),
+    ("file 600 B", lambda: send_file(sample(600))),
+    ("file 30 KB", lambda: send_file(sample(30 * 1024))),
+)
+ITERATIONS = 200
+
+
+async def run(write, make):
+    stream = Stream()
+    start = micros()
+    for _ in range(ITERATIONS):
+        response = make()
+        response.headers["Connection"] = "keep-alive"
+        await write(response, stream)
+    t = elapsed(start) / ITERATIONS
+    return t, stream.writes / ITERATIONS, stream.size // ITERATIONS
+
+
+async def main():
+    for name, make in RESPONSES:
+        t_old, old, size = await run(old_write, make)
+        t_new, new, size_new = await run(Response.write, make)
+        assert size == size_new
+        report(
+            name,
+            bytes=size,
+            writes_before=old,
+            writes_after=new,
+            us_before=t_old,
+            us_after=t_new,
+        )
+
+
+asyncio.run(main())
@@ -0,0 +1,70 @@
+# Routing: linear scan of the URL map vs the indexed Router, over the route
+# table of server.py
+from timing import bench, report
+
+from microdot import Microdot
+from microdot.microdot import Router
+
+app = Microdot()
+ROUTES = (
+    ("/ws", "GET"),
+    ("/progs", "GET"),
+    ("/logs", "GET"),
+    ("/history", "GET"),
+    ("/firings", "GET"),
+    ("/catalogue", "GET"),
+    ("/firings/<name>", "GET"),
+    ("/loglevel", "GET"),
+    ("/loglevel", "POST"),
+    ("/load/<name>", "GET"),
+    ("/setpoint", "POST"),
+    ("/upload", "POST"),
+    ("/delete", "POST"),
+    ("/<path:path>", "GET"),
+    ("/", "GET"),
+)
+for pattern, method in ROUTES:
+    app.route(pattern, methods=[method])(lambda request, **kwargs: pattern)
+
+
+def linear(method, path):
+    # Microdot.find_route before the router
+    f = 404
+    args = None
+    for route_methods, route_pattern, route_handler, _, _ in app.url_map:
+        args = route_pattern.match(path)
+        if args is not None:
+            if method in route_methods:
+                f = route_handler
+                break
+            else:
+                f = 405
+    return f, args
+
+
+router = Router(app.url_map)
+
+
+def indexed(method, path):
+    index, args, allowed = router.find(method, path)
+    if index is None:
+        return 404, None
+    return app.url_map[index][2] if allowed else 405, args
+
+
+REQUESTS = (
+    ("GET", "/"),
+    ("GET", "/progs"),
+    ("POST", "/setpoint"),
+    ("GET", "/firings/00012.bin"),
+    ("GET", "/load/bisque.json"),
+    ("GET", "/script.js"),
+    ("GET", "/programs/glaze.json"),
+    ("POST", "/script.js"),
+    ("DELETE", "/upload"),
+)
+for method, path in REQUESTS:
+    assert linear(method, path)[0] == indexed(method, path)[0], (method, path)
+    old = bench(lambda: linear(method, path), 2000)
+    new = bench(lambda: indexed(method, path), 2000)
+    report(f"{method} {path}", linear_us=old, indexed_us=new, speedup=old / new)
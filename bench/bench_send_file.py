@@ -0,0 +1,93 @@
+# Static file streaming: read() of a new bytes object per chunk vs readinto()
+# a pooled buffer, heap allocated per MB served at a few chunk sizes. Buffers
+# are only pooled on MicroPython, on CPython both rows take the read() path
+import asyncio
+from timing import micros, elapsed, report
+
+from microdot import Response, send_file
+
+try:
+    import gc
+
+    gc.mem_alloc  # MicroPython: total allocated with the collector off
+
+    async def heap(coro):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        await coro
+        total = gc.mem_alloc() - before
+        gc.enable()
+        return total
+
+except AttributeError:
+
+    async def heap(coro):
+        await coro  # CPython has no running total of allocations
+        return None
+
+
+class Stream:
+    async def awrite(self, data):
+        pass
+
+
+class Reader:
+    """A file without readinto(), streamed the old way"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+
+    def read(self, n):
+        return self.file.read(n)
+
+    def close(self):
+        self.file.close()
+
+
+PATH = "/tmp/bench_send_file.js"
+SIZE = 30 * 1024  # about the size of the UI
+with open(PATH, "wb") as f:
+    f.write(b"x" * SIZE)
+
+stream = Stream()
+
+
+async def serve(pooled, count):
+    for _ in range(count):
+        response = send_file(PATH, stream=None if pooled else Reader(PATH))
+        await response.write(stream)
+
+
+async def chunk_bytes(pooled):
+    # bytes in chunks allocated as new objects rather than views of a buffer
+    total = 0
+    iter = send_file(PATH, stream=None if pooled else Reader(PATH)).body_iter()
+    async for chunk in iter:
+        if not isinstance(chunk, memoryview):
+            total += len(chunk)
+    await iter.aclose()
+    return total
+
+
+async def main():
+    for chunk in (512, 1024, 2048):
+        Response.send_file_buffer_size = chunk
+        for label, pooled in (("read", False), ("readinto", True)):
+            await serve(pooled, 1)  # fill the pool
+            count = 20
+            start = micros()
+            await serve(pooled, count)
+            t = elapsed(start) / count
+            values = {
+                "us_per_file": t,
+                "MB_s": SIZE / t,
+                "chunk_bytes_per_MB": await chunk_bytes(pooled) * (1 << 20) // SIZE,
+            }
+            total = await heap(serve(pooled, 4))
+            if total is not None:
+                values["heap_bytes_per_MB"] = total * (1 << 20) // (4 * SIZE)
+            report(f"{chunk} B chunks {label}", **values)
+
+
+asyncio.run(main())
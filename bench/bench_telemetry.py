@@ -0,0 +1,48 @@
+# JSON vs binary telemetry frames: size, encode time and airtime per second
+from timing import bench, report
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from telemetry import BinaryEncoder, decode, diff, select
+
+info = {
+    "temp": 1043.25,
+    "duty": 0.4375,
+    "target": 1050.0,
+    "running": True,
+    "runtime": 18234.0,
+    "paused": False,
+    "current": 12.7,
+    "p": -0.012,
+    "i": 0.441,
+    "d": 0.0032,
+}
+
+encoder = BinaryEncoder()
+text = json.dumps(info)
+frame = encoder.encode(info)
+assert decode(frame)["running"]
+
+REFRESH = 1.0  # seconds, settings.ui.Refresh
+for name, data, fn in (
+    ("json", text, lambda: json.dumps(info)),
+    ("binary", frame, lambda: encoder.encode(info)),
+):
+    # websocket header is 2 bytes for payloads under 126 bytes, 4 otherwise
+    wire = len(data) + (2 if len(data) < 126 else 4)
+    report(name, bytes=len(data), bytes_per_s=wire / REFRESH, encode_us=bench(fn))
+
+# deltas while holding: temperature and PID terms move, the rest does not
+last = {}
+diff(info, last)
+held = dict(info, temp=1049.75, runtime=18235.0, p=-0.011, i=0.442, d=0.0031)
+mask = diff(held, dict(last))
+for name, data in (
+    ("json delta", json.dumps(select(held, mask))),
+    ("binary delta", encoder.encode(held, mask)),
+):
+    wire = len(data) + 2
+    report(name, bytes=len(data), bytes_per_s=wire / REFRESH)
@@ -0,0 +1,27 @@
+# Websocket payload unmasking: per byte generator vs in place unmask()
+from timing import bench, report
+
+from microdot.websocket import unmask
+
+mask = b"\x12\x34\x56\x78"
+
+
+def generator(payload):
+    return bytes(x ^ mask[i % 4] for i, x in enumerate(payload))
+
+
+for size in (16, 128, 1024, 16 * 1024):
+    payload = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+    buffer = bytearray(payload)
+    unmask(buffer, mask)
+    assert buffer == generator(payload)
+    iterations = max(10, 100_000 // size)
+    old = bench(lambda: generator(payload), iterations)
+    new = bench(lambda: unmask(buffer, mask), iterations)
+    report(
+        f"{size} B",
+        generator_us=old,
+        unmask_us=new,
+        speedup=old / new,
+        unmask_MB_s=size / new,
+    )
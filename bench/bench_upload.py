@@ -0,0 +1,67 @@
+# Uploads: read() of a new bytes object per 1 KB chunk written straight to the
+# destination vs readinto() a reusable buffer, checksummed, into a temp file
+# renamed at the end. Throughput and heap allocated per MB received
+import asyncio
+from timing import micros, elapsed, report
+
+from microdot.microdot import AsyncBytesIO
+from upload import Receiver
+
+try:
+    import gc
+
+    gc.mem_alloc  # MicroPython: total allocated with the collector off
+
+    async def heap(coro):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        await coro
+        total = gc.mem_alloc() - before
+        gc.enable()
+        return total
+
+except AttributeError:
+
+    async def heap(coro):
+        await coro  # CPython has no running total of allocations
+        return None
+
+
+PATH = "/tmp/bench_upload.bin"
+SIZE = 64 * 1024
+DATA = bytes(range(256)) * (SIZE // 256)
+
+
+async def old_upload(stream, path, size):
+    # the /upload handler before uploads were atomic
+    with open(path, "wb") as f:
+        while size > 0:
+            chunk = await stream.read(min(size, 1024))
+            f.write(chunk)
+            size -= len(chunk)
+
+
+async def run(upload, count):
+    for _ in range(count):
+        await upload(AsyncBytesIO(DATA), PATH, SIZE)
+
+
+async def main():
+    uploads = [("1024 B read", old_upload)]
+    for size in (1024, 2048, 4096):
+        uploads.append((f"{size} B readinto", Receiver(size).receive))
+    for label, upload in uploads:
+        await run(upload, 1)  # fill the spare buffer
+        count = 10
+        start = micros()
+        await run(upload, count)
+        t = elapsed(start) / count
+        values = {"ms_per_upload": t / 1000, "KB_s": SIZE * 1_000_000 / t / 1024}
+        total = await heap(run(upload, 2))
+        if total is not None:
+            values["heap_bytes_per_MB"] = total * (1 << 20) // (2 * SIZE)
+        report(label, **values)
+
+
+asyncio.run(main())
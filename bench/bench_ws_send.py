@@ -0,0 +1,113 @@
+# Websocket broadcast: frame built per client vs Frame encoded once, sent
+# with its header for small payloads. Counts awrite() calls and bytes allocated
+import asyncio
+from timing import micros, elapsed, report
+
+from microdot.websocket import Frame, WebSocket
+
+try:
+    import tracemalloc
+
+    async def allocated(steps):
+        # CPython frees as it goes, add up what each step holds at its peak
+        total = 0
+        tracemalloc.start()
+        for step in steps:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = step()
+            if result is not None:
+                await result
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        return total
+
+except ImportError:
+    import gc
+
+    async def allocated(steps):
+        gc.collect()
+        before = gc.mem_alloc()
+        for step in steps:
+            result = step()
+            if result is not None:
+                await result
+        return gc.mem_alloc() - before
+
+
+class Stream:
+    writes = 0
+
+    async def awrite(self, data):
+        Stream.writes += 1
+
+
+class Request:
+    sock = (None, Stream())
+
+
+CLIENTS = 4
+MESSAGES = 200
+clients = [WebSocket(Request()) for _ in range(CLIENTS)]
+
+
+async def old_send(ws, data, opcode=None):
+    # WebSocket.send before frames were encoded once
+    frame = ws._encode_websocket_frame(
+        opcode or (WebSocket.TEXT if isinstance(data, str) else WebSocket.BINARY),
+        data,
+    )
+    await ws.request.sock[1].awrite(frame)
+
+
+async def old(message, count=MESSAGES):
+    for _ in range(count):
+        for ws in clients:
+            await old_send(ws, message)
+
+
+async def new(message, count=MESSAGES):
+    for _ in range(count):
+        frame = Frame(message)
+        for ws in clients:
+            await ws.send(frame)
+
+
+def old_steps(message):
+    return [lambda ws=ws: old_send(ws, message) for ws in clients]
+
+
+def new_steps(message):
+    frame = []
+    steps = [lambda: frame.append(Frame(message))]
+    return steps + [lambda ws=ws: ws.send(frame[0]) for ws in clients]
+
+
+async def run(fn, steps, message):
+    await fn(message, 1)  # warm up
+    Stream.writes = 0
+    start = micros()
+    await fn(message)
+    t = elapsed(start) / (MESSAGES * CLIENTS)
+    writes = Stream.writes / (MESSAGES * CLIENTS)
+    alloc = await allocated(steps(message))
+    return t, writes, alloc
+
+
+async def main():
+    for name, message in (
+        ("binary 35 B", bytes(35)),
+        ("json 160 B", "x" * 160),
+        ("json 2 KB", "x" * 2048),
+    ):
+        for label, fn, steps in (("old", old, old_steps), ("new", new, new_steps)):
+            t, writes, alloc = await run(fn, steps, message)
+            report(
+                f"{name} {label}",
+                us_per_send=t,
+                writes_per_send=writes,
+                bytes_per_broadcast=alloc,
+            )
+
+
+asyncio.run(main())
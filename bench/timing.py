@@ -0,0 +1,40 @@
+# Shared helpers for the benchmarks, runs on CPython and MicroPython unix
+import sys
+
+sys.path.insert(0, ".")
+sys.path.insert(0, "lib")
+
+try:
+    from time import ticks_us, ticks_diff
+
+    def micros():
+        return ticks_us()
+
+    def elapsed(start):
+        return ticks_diff(ticks_us(), start)
+except ImportError:
+    from time import perf_counter
+
+    def micros():
+        return perf_counter() * 1_000_000
+
+    def elapsed(start):
+        return perf_counter() * 1_000_000 - start
+
+
+def bench(fn, iterations: int = 1000) -> float:
+    """Average run time of `fn` in microseconds"""
+    start = micros()
+    for _ in range(iterations):
+        fn()
+    return elapsed(start) / iterations
+
+
+def report(name: str, **values):
+    fields = []
+    for key, value in values.items():
+        if isinstance(value, float):
+            fields.append(f"{key}={value:.2f}")
+        else:
+            fields.append(f"{key}={value}")
+    print(f"{name}: {', '.join(fields)}")
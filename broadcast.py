@@ -0,0 +1,155 @@
+import asyncio
+from collections import deque
+import ujson as json
+from logger import Logger
+from microdot.websocket import Frame
+from telemetry import BinaryEncoder, diff, select, ALL_KEYS
+
+log = Logger(__name__)
+
+
+class Client:
+    """A websocket client with its own bounded send queue and writer task"""
+
+    def __init__(self, hub, ws, queue_size: int = 8):
+        self.hub = hub
+        self.ws = ws
+        self.queue = deque([], queue_size)
+        self.queue_size = queue_size
+        self.event = asyncio.Event()
+        self.dropped = 0  # messages dropped since the last successful send
+        self.binary = False  # negotiated by the client, JSON by default
+        self.delta = False  # only send what changed since the last message
+        self.last = {}  # last telemetry values sent, for deltas
+        self.ticks = 0
+        self.task = asyncio.create_task(self.writer())
+
+    def put(self, data) -> bool:
+        """Queue data for sending, dropping the oldest message when full"""
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            self.last = {}  # a delta may have been lost, resend everything
+        self.queue.append(data)
+        self.event.set()
+        return self.dropped <= self.hub.max_dropped
+
+    def negotiate(self, telemetry: str, delta: bool = False):
+        self.binary = telemetry == "binary"
+        self.delta = delta
+        self.last = {}  # start with a keyframe
+
+    async def writer(self):
+        try:
+            while True:
+                while len(self.queue) > 0:
+                    await self.ws.send(self.queue.popleft())
+                    self.dropped = 0
+                self.event.clear()
+                await self.event.wait()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.debug(f"Error sending data: {e}")
+            # the writer ends here, MicroPython can't cancel the running task
+            self.task = None
+            self.hub.remove(self)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        asyncio.create_task(self.disconnect())
+
+    async def disconnect(self):
+        # closing the stream wakes up the receive loop of the handler
+        try:
+            await self.ws.request.sock[1].aclose()
+        except Exception:
+            pass
+
+
+class Hub:
+    """Fan out messages to all connected websocket clients.
+
+    Messages are queued per client and sent by a writer task per client, so
+    broadcasting never waits on the network. Clients that fall more than
+    `max_dropped` messages behind are disconnected.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 4,
+        queue_size: int = 8,
+        max_dropped: int = 32,
+        keyframe_interval: int = 30,
+    ):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.keyframe_interval = keyframe_interval
+        self.clients = []
+        self.encoder = BinaryEncoder()
+
+    def add(self, ws) -> Client:
+        if len(self.clients) >= self.max_clients:
+            # the oldest connection is the most likely to be stale
+            log.warning("Too many websocket clients, dropping the oldest")
+            self.remove(self.clients[0])
+        client = Client(self, ws, self.queue_size)
+        self.clients.append(client)
+        log.debug(f"Websocket client added ({len(self.clients)} connected)")
+        return client
+
+    def remove(self, client: Client):
+        if client not in self.clients:
+            return
+        self.clients.remove(client)
+        client.close()
+        log.debug(f"Websocket client removed ({len(self.clients)} connected)")
+
+    def put(self, client: Client, data):
+        if not client.put(data):
+            log.warning("Websocket client too slow, disconnecting")
+            self.remove(client)
+
+    def broadcast(self, data) -> bool:
+        """Queue data (already serialised) for every client, never blocks"""
+        if isinstance(data, str):
+            data = Frame(data)  # encode the text once, not once per client
+        for client in self.clients[:]:
+            self.put(client, data)
+        return len(self.clients) > 0
+
+    def publish(self, info: dict) -> bool:
+        """Queue a telemetry snapshot, encoded once per format in use"""
+        text = None
+        frame = None
+        for client in self.clients[:]:
+            if client.delta:
+                self.put(client, self.encode_delta(client, info))
+            elif client.binary:
+                if frame is None:
+                    frame = self.encoder.encode(info)
+                self.put(client, frame)
+            else:
+                if text is None:
+                    text = Frame(json.dumps(info))
+                self.put(client, text)
+        return len(self.clients) > 0
+
+    def encode_delta(self, client: Client, info: dict):
+        if client.ticks >= self.keyframe_interval:
+            client.ticks = 0
+            client.last = {}
+        client.ticks += 1
+        mask = diff(info, client.last)
+        if client.binary:
+            return self.encoder.encode(info, mask)
+        if mask == ALL_KEYS:
+            return Frame(json.dumps(info))
+        # an empty delta still tells the client a tick went by
+        return Frame(json.dumps(select(info, mask)))
+
+    async def send(self, data):
+        # lets the hub stand in for a single websocket, e.g. for the logger
+        self.broadcast(data)
@@ -0,0 +1,238 @@
+import asyncio
+import binascii
+import hashlib
+import os
+import ujson as json
+from logger import Logger
+from upload import replace
+
+log = Logger(__name__)
+
+STAGING = ".bundle"  # the new tree is extracted here first
+COMPLETE = STAGING + "/.complete"  # journal of a swap in progress
+MANIFEST = "manifest.json"  # first member: {"files": {path: [size, sha256]}}
+BLOCK = 512
+WBITS = 10  # 1 KB deflate window, tools/make_bundle.py compresses with it
+
+try:
+    import deflate
+
+    def gunzip(file):
+        return deflate.DeflateIO(file, deflate.GZIP, WBITS)
+
+except ImportError:
+    try:
+        from zlib import DecompIO  # MicroPython before 1.21
+
+        def gunzip(file):
+            return DecompIO(file, 16 + WBITS)
+
+    except ImportError:
+        import gzip
+
+        def gunzip(file):
+            return gzip.GzipFile(fileobj=file)
+
+
+class BundleError(ValueError):
+    pass
+
+
+def read_fully(stream, view: memoryview) -> int:
+    """Fill `view` from a stream that may return short reads"""
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+def makedirs(path: str):
+    parts = path.split("/")
+    for i in range(1, len(parts) + 1):
+        try:
+            os.mkdir("/".join(parts[:i]))
+        except OSError:
+            pass  # already exists
+
+
+def remove_tree(path: str):
+    try:
+        mode = os.stat(path)[0]
+    except OSError:
+        return
+    if mode & 0x4000:  # a directory
+        for name in os.listdir(path):
+            remove_tree(f"{path}/{name}")
+        os.rmdir(path)
+    else:
+        os.remove(path)
+
+
+def member_name(header: memoryview) -> str:
+    name = bytes(header[0:100]).split(b"\0", 1)[0].decode()
+    if bytes(header[257:262]) == b"ustar":
+        prefix = bytes(header[345:500]).split(b"\0", 1)[0].decode()
+        if prefix:
+            name = f"{prefix}/{name}"
+    while name.startswith("./"):
+        name = name[2:]
+    name = name.rstrip("/")
+    if not name or name.startswith("/") or ".." in name.split("/"):
+        raise BundleError(f"Invalid path in bundle: {name}")
+    if name == STAGING or name.startswith(STAGING + "/"):
+        raise BundleError(f"Invalid path in bundle: {name}")
+    return name
+
+
+def octal(field: memoryview) -> int:
+    digits = bytes(field).split(b"\0", 1)[0].strip()
+    return int(digits, 8) if digits else 0
+
+
+class Installer:
+    """Installs a tar (or tar.gz) of the build tree.
+
+    Members are extracted to a staging directory, each checked against the
+    size and SHA-256 in the bundle's manifest, with RAM bounded by one
+    header block and one chunk buffer. Only once every file listed in the
+    manifest is staged are they moved over the live files. The list of
+    files to move is written first and renamed into place once complete, so
+    a reset half way through the move is completed by resume() on the next
+    boot.
+    """
+
+    def __init__(self, receiver):
+        self.receiver = receiver  # lends its buffer for the file contents
+        self.header = bytearray(BLOCK)
+        self.busy = False  # set by the caller from before the bundle arrives
+
+    async def install(self, path: str) -> list:
+        """Install the bundle at `path`, returns the files replaced"""
+        try:
+            paths = await self.extract(path)
+        except BaseException:
+            remove_tree(STAGING)
+            raise
+        self.commit(paths)
+        log.info(f"Installed {len(paths)} files from {path}")
+        return paths
+
+    async def extract(self, path: str) -> list:
+        remove_tree(STAGING)
+        makedirs(STAGING)
+        header = memoryview(self.header)
+        buffer = self.receiver.take()
+        try:
+            with open(path, "rb") as raw:
+                gzipped = raw.read(2) == b"\x1f\x8b"
+                raw.seek(0)
+                archive = gunzip(raw) if gzipped else raw
+                try:
+                    return await self.extract_members(archive, header, buffer)
+                except EOFError:  # CPython's gzip on a truncated stream
+                    raise BundleError("Truncated bundle")
+        finally:
+            self.receiver.release(buffer)
+
+    async def extract_members(self, archive, header, buffer) -> list:
+        view = memoryview(buffer)
+        manifest = None
+        paths = []
+        while True:
+            if read_fully(archive, header) != BLOCK:
+                raise BundleError("Truncated bundle")
+            checksum = octal(header[148:156])
+            if not checksum and not any(header):
+                break  # end of archive
+            if sum(header) - sum(header[148:156]) + 8 * 32 != checksum:
+                raise BundleError("Corrupt tar header")
+            name = member_name(header)
+            size = octal(header[124:136])
+            kind = header[156]
+            if kind == ord("5"):
+                makedirs(f"{STAGING}/{name}")
+                continue
+            if kind not in (0, ord("0")):
+                raise BundleError(f"Unsupported member type in bundle: {name}")
+
+            if manifest is None:
+                if name != MANIFEST:
+                    raise BundleError(f"{MANIFEST} must come first in the bundle")
+                data = bytearray(size)
+                if read_fully(archive, memoryview(data)) != size:
+                    raise BundleError("Truncated bundle")
+                manifest = json.loads(bytes(data).decode())["files"]
+            else:
+                entry = manifest.get(name)
+                if entry is None:
+                    raise BundleError(f"{name} is not in the manifest")
+                if entry[0] != size:
+                    raise BundleError(f"{name} is {size} bytes, expected {entry[0]}")
+                digest = await self.extract_file(archive, name, size, view)
+                if digest != entry[1]:
+                    raise BundleError(f"{name} does not match its SHA-256")
+                paths.append(name)
+
+            padding = -size % BLOCK
+            if padding and read_fully(archive, header[:padding]) != padding:
+                raise BundleError("Truncated bundle")
+
+        if manifest is None:
+            raise BundleError(f"No {MANIFEST} in the bundle")
+        missing = [path for path in manifest if path not in paths]
+        if missing:
+            raise BundleError(f"Missing from the bundle: {', '.join(missing)}")
+        return paths
+
+    async def extract_file(self, archive, name, size, view) -> str:
+        path = f"{STAGING}/{name}"
+        makedirs(path.rsplit("/", 1)[0])
+        digest = hashlib.sha256()
+        remaining = size
+        with open(path, "wb") as file:
+            while remaining > 0:
+                n = read_fully(archive, view[: min(remaining, len(view))])
+                if not n:
+                    raise BundleError("Truncated bundle")
+                chunk = view[:n]
+                digest.update(chunk)
+                file.write(chunk)
+                remaining -= n
+                await asyncio.sleep(0)  # let the control loop run
+        return binascii.hexlify(digest.digest()).decode()
+
+    def commit(self, paths: list):
+        # a reset while the list is written leaves only the .tmp, which
+        # resume() drops with the rest of the staging tree
+        temp = COMPLETE + ".tmp"
+        with open(temp, "w") as file:
+            file.write("\n".join(paths))
+        replace(temp, COMPLETE)
+        resume()
+
+
+def resume() -> list:
+    """Move a staged bundle into place if its swap was started, or drop it
+    if it was not. Returns the files moved.
+    """
+    try:
+        with open(COMPLETE, "r") as file:
+            paths = [path for path in file.read().split("\n") if path]
+    except OSError:
+        remove_tree(STAGING)
+        return []
+    for path in paths:
+        staged = f"{STAGING}/{path}"
+        try:
+            os.stat(staged)
+        except OSError:
+            continue  # moved before the reset
+        if "/" in path:
+            makedirs(path.rsplit("/", 1)[0])
+        replace(staged, path)
+    os.remove(COMPLETE)
+    remove_tree(STAGING)
+    return paths
@@ -0,0 +1,195 @@
+import struct
+import time
+from logger import Logger
+from utils import decode_name, encode_name, millis, ticks_add, ticks_diff
+
+log = Logger(__name__)
+
+# One fixed size record per firing: program name, start time (time.time()),
+# duration (s), peak temperature, max overshoot (C), energy (kWh), trace
+# file number and end reason
+RECORD = "<24sIIfffHBx"
+RECORD_SIZE = struct.calcsize(RECORD)
+
+RUNNING = 0  # not finished (yet), if found at boot the firing was cut short
+COMPLETED = 1
+STOPPED = 2
+FAULT = 3
+REASONS = ("running", "completed", "stopped", "fault")
+
+
+class Catalogue:
+    """Append-only file with a summary record of every firing.
+
+    A record is appended when a firing starts and rewritten in place when it
+    ends, statistics in between are only kept in RAM.
+    """
+
+    def __init__(self, path: str = "firings/catalogue.dat", voltage: float = 230.0):
+        self.path = path
+        self.voltage = voltage
+        self.buffer = bytearray(RECORD_SIZE)
+        self.active = False
+        self.index = 0
+        self.name = b""
+        self.trace = 0
+        self.start = 0
+        self.start_ms = 0
+        self.last_ms = 0
+        self.peak = 0.0
+        self.overshoot = 0.0
+        self.energy = 0.0  # Ws
+        self.interrupted = -1  # index of the record recover() marked a fault
+        self.recover()
+
+    def count(self) -> int:
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(0, 2)
+                return file.tell() // RECORD_SIZE
+        except OSError:
+            return 0
+
+    def recover(self):
+        # a firing still marked running was interrupted by a reset
+        index = self.count() - 1
+        if index < 0:
+            return
+        record = self.read(index, 1)
+        if record and record[0]["reason"] == "running":
+            log.warning(f"Firing {record[0]['name']} was interrupted")
+            self.rewrite_reason(index, FAULT)
+            self.interrupted = index
+
+    def reopen(self, name: str, runtime: float = 0) -> int | None:
+        """Continue the record of the firing interrupted before this boot,
+        setting it back to running, `runtime` (s) into it. Returns its trace
+        file number, or None if there is no such record for `name`.
+
+        Statistics are only written when a firing ends, those from before
+        the reset are lost.
+        """
+        index = self.interrupted
+        self.interrupted = -1
+        if index < 0:
+            return None
+        record = self.read(index, 1)
+        if not record or record[0]["name"].encode() != encode_name(name, 24):
+            return None
+        record = record[0]
+        self.active = True
+        self.index = index
+        self.name = encode_name(name, 24)
+        self.trace = record["trace"]
+        self.start = record["start"]
+        # the time the device was off is not counted in the duration
+        elapsed = int(max(runtime, record["duration"]) * 1000)
+        self.start_ms = ticks_add(millis(), -elapsed)
+        self.last_ms = millis()
+        self.peak = record["peak"]
+        self.overshoot = record["overshoot"]
+        self.energy = record["energy"] * 3_600_000
+        self.write(RUNNING)
+        log.info(f"Firing {record['name']} resumed in record {index}")
+        return self.trace
+
+    def rewrite_reason(self, index: int, reason: int):
+        try:
+            with open(self.path, "r+b") as file:
+                file.seek(index * RECORD_SIZE + RECORD_SIZE - 2)
+                file.write(bytes((reason,)))
+        except OSError as e:
+            log.error(f"Error updating firing catalogue: {e}")
+
+    def begin(self, name: str, trace: int = 0):
+        self.active = True
+        self.index = self.count()
+        self.name = encode_name(name, 24)
+        self.trace = trace
+        self.start = int(time.time())
+        self.start_ms = millis()
+        self.last_ms = self.start_ms
+        self.peak = 0.0
+        self.overshoot = 0.0
+        self.energy = 0.0
+        self.write(RUNNING, append=True)
+
+    def update(self, info: dict):
+        if not self.active:
+            return
+        now = millis()
+        dt = ticks_diff(now, self.last_ms) / 1000
+        self.last_ms = now
+        self.energy += self.voltage * info["current"] * dt
+        temp = info["temp"]
+        if temp is None:
+            return
+        if temp > self.peak:
+            self.peak = temp
+        target = info["target"]
+        if target is not None and temp - target > self.overshoot:
+            self.overshoot = temp - target
+
+    def end(self, reason: int):
+        if not self.active:
+            return
+        self.active = False
+        self.write(reason)
+        log.info(f"Firing {self.name.decode()} ended: {REASONS[reason]}")
+
+    def write(self, reason: int, append: bool = False):
+        struct.pack_into(
+            RECORD,
+            self.buffer,
+            0,
+            self.name,
+            self.start,
+            ticks_diff(millis(), self.start_ms) // 1000,
+            self.peak,
+            self.overshoot,
+            self.energy / 3_600_000,
+            self.trace,
+            reason,
+        )
+        try:
+            with open(self.path, "ab" if append else "r+b") as file:
+                if not append:
+                    file.seek(self.index * RECORD_SIZE)
+                file.write(self.buffer)
+        except OSError as e:
+            log.error(f"Error writing firing catalogue: {e}")
+
+    def read(self, start: int, count: int) -> list:
+        """Records start..start+count (oldest is 0) as dictionaries"""
+        records = []
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(start * RECORD_SIZE)
+                for _ in range(count):
+                    if file.readinto(self.buffer) != RECORD_SIZE:
+                        break
+                    values = struct.unpack(RECORD, self.buffer)
+                    records.append(
+                        {
+                            "name": decode_name(values[0]),
+                            "start": values[1],
+                            "duration": values[2],
+                            "peak": values[3],
+                            "overshoot": values[4],
+                            "energy": values[5],
+                            "trace": values[6],
+                            "reason": REASONS[values[7]],
+                        }
+                    )
+        except OSError:
+            pass
+        return records
+
+    def page(self, page: int = 0, per_page: int = 20) -> dict:
+        """A page of records, newest first"""
+        total = self.count()
+        end = total - page * per_page
+        start = max(0, end - per_page)
+        records = self.read(start, end - start) if end > 0 else []
+        records.reverse()
+        return {"total": total, "page": page, "records": records}
@@ -0,0 +1,109 @@
+import binascii
+import struct
+from logger import Logger
+from utils import decode_name, encode_name, millis, ticks_diff
+
+log = Logger(__name__)
+
+# Checkpoint record: magic, sequence number, program file name (empty for a
+# plain setpoint), runtime (s), PID integral, setpoint, paused, active and a
+# CRC32 of everything before it. Records rotate through SLOTS fixed slots,
+# the valid record with the highest sequence number is the current one.
+MAGIC = 0x4B43
+RECORD = "<HI24sfffBBxx"
+RECORD_SIZE = struct.calcsize(RECORD) + 4
+SLOTS = 8
+
+
+class State:
+    def __init__(self, program, runtime, integral, setpoint, paused, active):
+        self.program = program
+        self.runtime = runtime
+        self.integral = integral
+        self.setpoint = setpoint
+        self.paused = paused
+        self.active = active
+
+
+class Checkpoint:
+    """Periodic snapshot of a running firing so it can resume after a reset.
+
+    Each save is a single small write to the next slot, so a torn write
+    only ever loses the newest record and writes are spread over the slots.
+    """
+
+    def __init__(self, path: str = "checkpoint.dat", interval: float = 60.0):
+        self.path = path
+        self.interval = int(interval * 1000)
+        self.buffer = bytearray(RECORD_SIZE)
+        self.seq = 0
+        self.last_ms = 0
+        self.active = False
+        state = self.load()
+        if state is None:
+            # create all the slots up front, later writes never grow the file
+            try:
+                with open(self.path, "wb") as file:
+                    file.write(bytes(RECORD_SIZE * SLOTS))
+            except OSError as e:
+                log.error(f"Error creating checkpoint file: {e}")
+
+    def load(self) -> State | None:
+        """The newest valid checkpoint, or None"""
+        best = None
+        try:
+            with open(self.path, "rb") as file:
+                for _ in range(SLOTS):
+                    if file.readinto(self.buffer) != RECORD_SIZE:
+                        break
+                    crc = struct.unpack_from("<I", self.buffer, RECORD_SIZE - 4)[0]
+                    data = memoryview(self.buffer)[: RECORD_SIZE - 4]
+                    if binascii.crc32(data) & 0xFFFFFFFF != crc:
+                        continue
+                    values = struct.unpack_from(RECORD, self.buffer)
+                    if values[0] != MAGIC:
+                        continue
+                    if best is None or values[1] > best[1]:
+                        best = values
+        except OSError:
+            return None
+        if best is None:
+            return State("", 0.0, 0.0, 0.0, False, False)
+        self.seq = best[1]
+        return State(
+            decode_name(best[2]),
+            best[3],
+            best[4],
+            best[5],
+            bool(best[6]),
+            bool(best[7]),
+        )
+
+    def save(self, program: str, runtime, integral, setpoint, paused, active):
+        self.seq += 1
+        self.last_ms = millis()
+        self.active = active
+        struct.pack_into(
+            RECORD,
+            self.buffer,
+            0,
+            MAGIC,
+            self.seq,
+            encode_name(program, 24),
+            runtime,
+            integral,
+            setpoint or 0.0,
+            1 if paused else 0,
+            1 if active else 0,
+        )
+        crc = binascii.crc32(memoryview(self.buffer)[: RECORD_SIZE - 4]) & 0xFFFFFFFF
+        struct.pack_into("<I", self.buffer, RECORD_SIZE - 4, crc)
+        try:
+            with open(self.path, "r+b") as file:
+                file.seek((self.seq % SLOTS) * RECORD_SIZE)
+                file.write(self.buffer)
+        except OSError as e:
+            log.error(f"Error writing checkpoint: {e}")
+
+    def due(self) -> bool:
+        return ticks_diff(millis(), self.last_ms) >= self.interval
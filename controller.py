@@ -5,6 +5,9 @@ from program import Program
 from simple_pid import PID
 from logger import Logger
 from current_clamp import CT
+from recorder import Recorder
+from catalogue import Catalogue, COMPLETED, STOPPED, FAULT
+from checkpoint import Checkpoint
 import time
 
 log = Logger(__name__)
@@ -28,8 +31,10 @@ class Controller:
     running = False
     cycle_start = 0.0
     program = None
+    program_file = None
     paused = False
     err_count = 0
+    fault = False
 
     def __init__(self):
         self.settings = Settings()
@@ -57,6 +62,15 @@ class Controller:
         )
         self.ct.calibrate()
         self.ct.start()
+        self.recorder = Recorder(
+            interval=self.settings.recorder.RecordInterval,
+            flush_interval=self.settings.recorder.RecordFlushInterval,
+            max_files=self.settings.recorder.RecordMaxFirings,
+        )
+        self.catalogue = Catalogue(voltage=self.settings.ct.CTVoltage)
+        self.checkpoint = Checkpoint(
+            interval=self.settings.controller.CheckpointInterval
+        )
 
     def reset(self):
         self.stop()
@@ -77,7 +91,7 @@ class Controller:
             setpoint = self.setpoint
 
         if setpoint is None:
-            self.stop()
+            self.stop(COMPLETED)
         else:
             return setpoint
 
@@ -89,6 +103,7 @@ class Controller:
         return time.time() - self.cycle_start
 
     def set_program(self, name: str = None):
+        self.program_file = name
         if name is None:
             self.program = None
             return
@@ -97,20 +112,80 @@ class Controller:
         except Exception as e:
             log.error(f"Error loading {name} program: {e}")
             self.program = None
+            self.program_file = None
+
+    def save_checkpoint(self):
+        self.checkpoint.save(
+            self.program_file,
+            self.runtime(),
+            self.pid.components[1],
+            self.setpoint,
+            self.paused,
+            self.running,
+        )
 
-    def start(self):
+    def restore(self):
+        """Resume a firing that was interrupted by a reset.
+
+        The firing carries on in its own catalogue record, set back from
+        fault to running, and its trace file is appended to, so a resumed
+        firing is still a single entry.
+        """
+        state = self.checkpoint.load()
+        if state is None or not state.active:
+            return False
+        self.temp = self.temp_sensor.read()
+        if state.program:
+            self.set_program(state.program)
+            if self.program is None:
+                return False
+            runtime = self.program.seek(state.runtime, self.temp)
+        else:
+            self.set_program()
+            self.setpoint = state.setpoint
+            runtime = state.runtime
+        log.warning(f"Resuming {state.program or 'setpoint'} at {runtime:.0f}s")
+        self.duty = state.integral  # start() seeds the PID integral with it
+        self.start(resume=runtime)
+        self.cycle_start = time.time() - runtime
+        if state.paused:
+            self.pause()
+        else:
+            self.save_checkpoint()
+        return True
+
+    def start(self, resume: float = None):
+        # `resume`: runtime (s) of an interrupted firing to continue
         if self.running or self.paused:
             return
         self.relay.start()
         self.pid.set_auto_mode(True, last_output=self.duty)
         self.cycle_start = time.time()
         self.running = True
+        self.fault = False
+        name = self.program.name if self.program else "setpoint"
+        if resume is None or not self.reopen_record(name, resume):
+            self.recorder.begin(name)
+            self.catalogue.begin(name, self.recorder.number)
+        self.save_checkpoint()
+
+    def reopen_record(self, name: str, runtime: float) -> bool:
+        """Continue the catalogue record and trace of an interrupted firing"""
+        trace = self.catalogue.reopen(name, runtime)
+        if trace is None:
+            return False
+        if not self.recorder.reopen(trace):
+            # rotated away or unreadable, the record points at a new trace
+            self.recorder.begin(name)
+            self.catalogue.trace = self.recorder.number
+        return True
 
     def pause(self):
         if self.paused or not self.running:
             return
         self.paused = True
         self.paused_time = time.time()
+        self.save_checkpoint()
 
     def resume(self):
         if not self.paused or not self.running:
@@ -118,8 +193,9 @@ class Controller:
         self.cycle_start += time.time() - self.paused_time
         self.paused_time = 0
         self.paused = False
+        self.save_checkpoint()
 
-    def stop(self):
+    def stop(self, reason: int = STOPPED):
         if not self.running:
             return
         self.running = False
@@ -129,6 +205,9 @@ class Controller:
         self.paused_time = 0
         self.relay.stop()
         self.pid.set_auto_mode(False)
+        self.recorder.end()
+        self.catalogue.end(FAULT if self.fault else reason)
+        self.save_checkpoint()  # no longer active, don't resume on boot
 
     def loop(self):
         self.temp = self.temp_sensor.read()
@@ -137,9 +216,18 @@ class Controller:
         if not self.running:
             return
 
+        self.step()
+        info = self.info()
+        self.recorder.record(info)
+        self.catalogue.update(info)
+        if self.running and self.checkpoint.due():
+            self.save_checkpoint()
+
+    def step(self):
         if self.err_count > 5:
             log.error("Too many temp sensor errors")
             self.err_count = 0
+            self.fault = True
             self.pause()
             return
 
@@ -151,6 +239,8 @@ class Controller:
         self.err_count = 0
 
         self.setpoint = self.get_setpoint()
+        if not self.running:
+            return  # program finished
         self.pid.setpoint = self.setpoint
         self.duty = self.pid(self.temp)
 
@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+
+class FlashLog:
+    """Log sink that keeps the last few log files on flash.
+
+    Lines are collected in a page sized RAM buffer and only written out when
+    the page is full, on a timer or when an error is logged. Files are used
+    as a ring, once the current file exceeds `file_size` the next (oldest)
+    one is truncated and becomes the current file.
+    """
+
+    def __init__(
+        self,
+        directory: str = "logs",
+        files: int = 4,
+        file_size: int = 16 * 1024,
+        page_size: int = 512,
+        flush_interval: float = 5.0,
+    ):
+        self.directory = directory
+        self.files = files
+        self.file_size = file_size
+        self.flush_interval = flush_interval
+        self.buffer = bytearray(page_size)
+        self.length = 0
+        self.task = None
+
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # already exists
+
+        self.index = 0
+        try:
+            with open(self.head_path(), "r") as file:
+                self.index = int(file.read()) % files
+        except (OSError, ValueError):
+            self.index = 0
+        self.size = self.file_length(self.index)
+
+    def path(self, index: int) -> str:
+        return f"{self.directory}/{index}.log"
+
+    def head_path(self) -> str:
+        return f"{self.directory}/head"
+
+    def file_length(self, index: int) -> int:
+        try:
+            return os.stat(self.path(index))[6]
+        except OSError:
+            return 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.flush()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def write(self, line: str, urgent: bool = False):
+        data = line.encode() + b"\n"
+        n = len(data)
+        if self.length + n > len(self.buffer):
+            self.flush()
+        if n > len(self.buffer):
+            # does not fit in a page, write it straight through
+            self.write_file(data)
+        else:
+            self.buffer[self.length : self.length + n] = data
+            self.length += n
+        if urgent:
+            self.flush()
+
+    def flush(self):
+        if self.length == 0:
+            return
+        self.write_file(memoryview(self.buffer)[: self.length])
+        self.length = 0
+
+    def write_file(self, data):
+        if self.size + len(data) > self.file_size:
+            self.rotate()
+        try:
+            with open(self.path(self.index), "ab") as file:
+                file.write(data)
+            self.size += len(data)
+        except OSError as e:
+            # can't log this, we are the log
+            print(f"Error writing log file: {e}")
+
+    def rotate(self):
+        self.index = (self.index + 1) % self.files
+        self.size = 0
+        try:
+            open(self.path(self.index), "wb").close()
+            with open(self.head_path(), "w") as file:
+                file.write(str(self.index))
+        except OSError as e:
+            print(f"Error rotating log file: {e}")
+
+    def stream(self, chunk_size: int = 512):
+        """Generator over all the log files, oldest first, in small chunks"""
+        self.flush()
+        for i in range(1, self.files + 1):
+            index = (self.index + i) % self.files
+            try:
+                file = open(self.path(index), "rb")
+            except OSError:
+                continue
+            with file:
+                while True:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
@@ -0,0 +1,199 @@
+from array import array
+import ujson as json
+from utils import millis, ticks_add, ticks_diff
+
+NAN = float("nan")
+
+
+def number(value):
+    # the arrays store None as NaN, JSON has no NaN
+    return None if value != value else value
+
+
+class Tier:
+    """Fixed size ring buffer of telemetry samples.
+
+    Samples are stored column wise in arrays so the memory use is fixed at
+    start up and recording never allocates. A tier with a `resolution` (ms)
+    averages the incoming samples into buckets of that length and also keeps
+    the temperature min/max of each bucket.
+    """
+
+    def __init__(self, size: int, resolution: int = 0):
+        self.size = size
+        self.resolution = resolution
+        self.time = array("i", [0] * size)  # millis(), start of the bucket
+        self.temp = array("f", [0.0] * size)
+        self.target = array("f", [0.0] * size)
+        self.duty = array("f", [0.0] * size)
+        self.current = array("f", [0.0] * size)
+        if resolution:
+            self.temp_min = array("f", [0.0] * size)
+            self.temp_max = array("f", [0.0] * size)
+        self.head = 0  # next slot to write
+        self.count = 0
+
+        # running bucket
+        self.bucket = 0
+        self.n = 0
+        self.temp_n = 0
+        self.temp_sum = 0.0
+        self.temp_lo = 0.0
+        self.temp_hi = 0.0
+        self.target_n = 0
+        self.target_sum = 0.0
+        self.duty_sum = 0.0
+        self.current_sum = 0.0
+
+    def add(self, now: int, temp, target, duty: float, current: float):
+        if not self.resolution:
+            self.store(now, temp, target, duty, current, temp, temp)
+            return
+
+        bucket = now - now % self.resolution
+        if self.n and bucket != self.bucket:
+            self.flush()
+        self.bucket = bucket
+        self.n += 1
+        if temp is not None:
+            if self.temp_n == 0 or temp < self.temp_lo:
+                self.temp_lo = temp
+            if self.temp_n == 0 or temp > self.temp_hi:
+                self.temp_hi = temp
+            self.temp_n += 1
+            self.temp_sum += temp
+        if target is not None:
+            self.target_n += 1
+            self.target_sum += target
+        self.duty_sum += duty
+        self.current_sum += current
+
+    def flush(self):
+        if self.n == 0:
+            return
+        temp = self.temp_sum / self.temp_n if self.temp_n else None
+        target = self.target_sum / self.target_n if self.target_n else None
+        lo = self.temp_lo if self.temp_n else None
+        hi = self.temp_hi if self.temp_n else None
+        self.store(
+            self.bucket,
+            temp,
+            target,
+            self.duty_sum / self.n,
+            self.current_sum / self.n,
+            lo,
+            hi,
+        )
+        self.n = 0
+        self.temp_n = 0
+        self.temp_sum = 0.0
+        self.target_n = 0
+        self.target_sum = 0.0
+        self.duty_sum = 0.0
+        self.current_sum = 0.0
+
+    def store(self, now: int, temp, target, duty, current, lo, hi):
+        i = self.head
+        self.time[i] = now
+        self.temp[i] = NAN if temp is None else temp
+        self.target[i] = NAN if target is None else target
+        self.duty[i] = duty
+        self.current[i] = current
+        if self.resolution:
+            self.temp_min[i] = NAN if lo is None else lo
+            self.temp_max[i] = NAN if hi is None else hi
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def slot(self, n: int) -> int:
+        """Array index of the n-th oldest sample"""
+        return (self.head - self.count + n) % self.size
+
+    def first_after(self, since: int) -> int:
+        """Position (oldest first) of the first sample newer than `since`,
+        for rollups the first bucket that ends after `since`, 0 for None"""
+        if since is None:
+            return 0
+        since = ticks_add(since, -self.resolution)
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ticks_diff(self.time[self.slot(mid)], since) <= 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def covers(self, since: int) -> bool:
+        """Whether nothing newer than `since` has been overwritten yet"""
+        if self.count < self.size:
+            return True
+        return since is not None and ticks_diff(self.time[self.slot(0)], since) <= 0
+
+    def row(self, i: int) -> list:
+        row = [
+            self.time[i],
+            number(self.temp[i]),
+            number(self.target[i]),
+            self.duty[i],
+            self.current[i],
+        ]
+        if self.resolution:
+            row.append(number(self.temp_min[i]))
+            row.append(number(self.temp_max[i]))
+        return row
+
+
+class History:
+    """Recent telemetry at several resolutions.
+
+    Every sample goes into the raw tier and into each rollup tier, so a long
+    firing is still available at a coarser resolution once the raw samples
+    have been overwritten. Memory use is fixed regardless of firing length.
+    """
+
+    def __init__(self, size: int = 600, rollups=((10_000, 360), (60_000, 720))):
+        self.tiers = [Tier(size)]
+        for resolution, rollup_size in rollups:
+            if rollup_size > 0:
+                self.tiers.append(Tier(rollup_size, resolution))
+
+    def record(self, info: dict, now: int = None):
+        if now is None:
+            now = millis()
+        for tier in self.tiers:
+            tier.add(now, info["temp"], info["target"], info["duty"], info["current"])
+
+    def select(self, since: int, points: int) -> Tier:
+        """The finest tier that has everything since `since` within `points`"""
+        for tier in self.tiers:
+            if tier.covers(since) and tier.count - tier.first_after(since) <= points:
+                return tier
+        return self.tiers[-1]
+
+    def stream(self, since: int = 0, points: int = None, chunk: int = 32):
+        """JSON document of the samples newer than `since`, in small pieces.
+
+        `{"now": <millis>, "resolution": <ms>, "samples": [[time, temp,
+        target, duty, current(, temp_min, temp_max)], ...]}`
+        The resolution is 0 for raw samples. Everything is returned for a
+        `since` of 0, or one in the future, which means the device restarted.
+        Times are millis(), they wrap like ticks_ms().
+        """
+        now = millis()
+        if since <= 0 or ticks_diff(since, now) > 0:
+            since = None
+        if points is None:
+            points = self.tiers[0].size
+        tier = self.select(since, points)
+        start = tier.first_after(since)
+        yield '{"now": %d, "resolution": %d, "samples": [' % (now, tier.resolution)
+        for n in range(start, tier.count, chunk):
+            rows = []
+            for m in range(n, min(n + chunk, tier.count)):
+                rows.append(tier.row(tier.slot(m)))
+            data = json.dumps(rows)[1:-1]
+            yield data if n == start else "," + data
+        yield "]}"
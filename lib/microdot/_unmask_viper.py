@@ -0,0 +1,25 @@
+# Websocket unmasking with the viper emitter, 32 bits at a time. Native code
+# needs ``mpy-cross -march=...`` for the board, the Makefile builds this file
+# on its own for that reason. ``websocket`` falls back to a pure Python
+# version when this module can't be imported.
+import micropython
+
+
+@micropython.viper
+def unmask(payload, mask):
+    buf = ptr8(payload)  # noqa: F821
+    m = ptr8(mask)  # noqa: F821
+    n = int(len(payload))
+    i = 0
+    if (int(buf) & 3) == 0:
+        # aligned, XOR whole little endian words
+        words = ptr32(payload)  # noqa: F821
+        key = m[0] | (m[1] << 8) | (m[2] << 16) | (m[3] << 24)
+        count = n >> 2
+        while i < count:
+            words[i] = words[i] ^ key
+            i += 1
+        i = count << 2
+    while i < n:
+        buf[i] = buf[i] ^ m[i & 3]
+        i += 1
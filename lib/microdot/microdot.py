@@ -7,7 +7,9 @@ servers for MicroPython and standard Python.
 """
 import asyncio
 import io
+import os
 import re
+import sys
 import time
 
 try:
@@ -45,6 +47,15 @@ except ImportError:  # pragma: no cover
             ret = await ret
         return ret
 
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:  # pragma: no cover
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
 try:
     from sys import print_exception
 except ImportError:  # pragma: no cover
@@ -53,6 +64,11 @@ except ImportError:  # pragma: no cover
     def print_exception(exc):
         traceback.print_exc()
 
+# MicroPython's Stream.write() copies what it is given, so a buffer can be
+# refilled as soon as awrite() returns. CPython's StreamWriter (3.12+) may
+# queue a view of the data instead, to be sent later.
+AWRITE_COPIES = sys.implementation.name == 'micropython'
+
 MUTED_SOCKET_ERRORS = [
     32,  # Broken pipe
     54,  # Connection reset by peer
@@ -275,6 +291,9 @@ class AsyncBytesIO:
     async def readexactly(self, n):  # pragma: no cover
         return self.stream.read(n)
 
+    async def readinto(self, buf):  # pragma: no cover
+        return self.stream.readinto(buf)
+
     async def readuntil(self, separator=b'\n'):  # pragma: no cover
         return self.stream.readuntil(separator=separator)
 
@@ -321,7 +340,7 @@ class Request:
 
     def __init__(self, app, client_addr, method, url, http_version, headers,
                  body=None, stream=None, sock=None, url_prefix='',
-                 subapp=None):
+                 subapp=None, raw_headers=None):
         #: The application instance to which this request belongs.
         self.app = app
         #: The address of the client, as a tuple (host, port).
@@ -343,14 +362,13 @@ class Request:
         #: The parsed query string, as a
         #: :class:`MultiDict <microdot.MultiDict>` object.
         self.args = {}
-        #: A dictionary with the headers included in the request.
-        self.headers = headers
-        #: A dictionary with the cookies included in the request.
-        self.cookies = {}
+        # the header lines as received, parsed into ``headers`` on first use
+        self._raw_headers = raw_headers
+        self._headers = headers
+        self._cookies = None
         #: The parsed ``Content-Length`` header.
         self.content_length = 0
-        #: The parsed ``Content-Type`` header.
-        self.content_type = None
+        self._content_type = False  # not looked up yet
         #: A general purpose container for applications to store data during
         #: the life of the request.
         self.g = Request.G()
@@ -360,14 +378,9 @@ class Request:
             self.path, self.query_string = self.path.split('?', 1)
             self.args = self._parse_urlencoded(self.query_string)
 
-        if 'Content-Length' in self.headers:
-            self.content_length = int(self.headers['Content-Length'])
-        if 'Content-Type' in self.headers:
-            self.content_type = self.headers['Content-Type']
-        if 'Cookie' in self.headers:
-            for cookie in self.headers['Cookie'].split(';'):
-                name, value = cookie.strip().split('=', 1)
-                self.cookies[name] = value
+        content_length = self.header('Content-Length')
+        if content_length:
+            self.content_length = int(content_length)
 
         self._body = body
         self.body_used = False
@@ -393,38 +406,100 @@ class Request:
         object.
         """
         # request line
-        line = (await Request._safe_readline(client_reader)).strip().decode()
+        line = (await Request._safe_readline(client_reader)).strip()
         if not line:  # pragma: no cover
             return None
-        method, url, http_version = line.split()
+        method, url, http_version = line.decode().split()
         http_version = http_version.split('/', 1)[1]
 
-        # headers
-        headers = NoCaseDict()
+        # headers, kept as raw lines and only decoded when the application
+        # looks at them, except for the length of the body
+        lines = []
         content_length = 0
         while True:
-            line = (await Request._safe_readline(
-                client_reader)).strip().decode()
-            if line == '':
+            line = await Request._safe_readline(client_reader)
+            if len(line) <= 2 and not line.strip():
                 break
-            header, value = line.split(':', 1)
-            value = value.strip()
-            headers[header] = value
-            if header.lower() == 'content-length':
-                content_length = int(value)
+            lines.append(line)
+            if len(line) > 15 and line[14] == 58 and \
+                    line[:14].lower() == b'content-length':
+                content_length = int(line[15:].decode())
 
         # body
-        body = b''
         if content_length and content_length <= Request.max_body_length:
             body = await client_reader.readexactly(content_length)
             stream = None
         else:
+            # nothing to read for a GET, the stream is only used if the
+            # body is too large to be read up front
             body = b''
             stream = client_reader
 
-        return Request(app, client_addr, method, url, http_version, headers,
+        return Request(app, client_addr, method, url, http_version, None,
                        body=body, stream=stream,
-                       sock=(client_reader, client_writer))
+                       sock=(client_reader, client_writer),
+                       raw_headers=lines)
+
+    @property
+    def headers(self):
+        """A dictionary with the headers included in the request."""
+        if self._headers is None:
+            headers = NoCaseDict()
+            for line in self._raw_headers or ():
+                header, value = line.decode().split(':', 1)
+                headers[header] = value.strip()
+            self._headers = headers
+            self._raw_headers = None
+        return self._headers
+
+    @headers.setter
+    def headers(self, value):
+        self._headers = value
+        self._raw_headers = None
+
+    def header(self, name, default=None):
+        """Return the value of a request header, or ``default`` if the
+        request does not have it.
+
+        Unlike ``headers``, this does not decode the other headers of the
+        request.
+        """
+        if self._headers is not None:
+            return self._headers.get(name, default)
+        key = name.lower().encode()
+        n = len(key)
+        value = default
+        for line in self._raw_headers or ():
+            if len(line) > n and line[n] == 58 and line[:n].lower() == key:
+                value = line[n + 1:].strip().decode()
+        return value
+
+    @property
+    def cookies(self):
+        """A dictionary with the cookies included in the request."""
+        if self._cookies is None:
+            self._cookies = {}
+            cookies = self.header('Cookie')
+            if cookies:
+                for cookie in cookies.split(';'):
+                    name, value = cookie.strip().split('=', 1)
+                    self._cookies[name] = value
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value):
+        self._cookies = value
+
+    @property
+    def content_type(self):
+        """The parsed ``Content-Type`` header."""
+        if self._content_type is False:
+            self._content_type = self.header('Content-Type')
+        return self._content_type
+
+    @content_type.setter
+    def content_type(self, value):
+        self._content_type = value
 
     def _parse_urlencoded(self, urlencoded):
         data = MultiDict()
@@ -556,8 +631,24 @@ class Response:
         'txt': 'text/plain',
     }
 
+    #: The size of the chunks files are streamed in. On MicroPython files
+    #: are read into pooled buffers of this size, so serving a file does not
+    #: allocate a new bytes object per chunk.
+    #:
+    #: Example::
+    #:
+    #:    Response.send_file_buffer_size = 2048
     send_file_buffer_size = 1024
 
+    #: The number of idle file streaming buffers kept for reuse.
+    send_file_buffer_pool_size = 2
+    _buffer_pool = []
+
+    #: Responses are written with the status line, the headers and the
+    #: start of the body in a single write when they fit in this many
+    #: bytes, the default is the payload of a full size TCP segment.
+    write_buffer_size = 1460
+
     #: The content type to use for responses that do not explicitly define a
     #: ``Content-Type`` header.
     default_content_type = 'text/plain'
@@ -646,40 +737,63 @@ class Response:
             if 'charset=' not in self.headers['Content-Type']:
                 self.headers['Content-Type'] += '; charset=UTF-8'
 
+    def _head(self):
+        reason = self.reason if self.reason is not None else \
+            ('OK' if self.status_code == 200 else 'N/A')
+        lines = ['HTTP/1.1 ', str(self.status_code), ' ', reason, '\r\n']
+        for header, value in self.headers.items():
+            values = value if isinstance(value, list) else [value]
+            for value in values:
+                lines += [header, ': ', str(value), '\r\n']
+        lines.append('\r\n')
+        return ''.join(lines).encode()
+
+    async def _write_head(self, stream, head, body=b''):
+        # one write for the status line and headers, and for the body too
+        # when it fits in a segment. They are joined into a new bytes object
+        # rather than a shared buffer, as CPython's StreamWriter may hold on
+        # to what it is given until it is sent
+        if body and len(head) + len(body) <= Response.write_buffer_size:
+            await stream.awrite(head + body)
+            return
+        await stream.awrite(head)
+        if body:
+            await stream.awrite(body)
+
     async def write(self, stream):
         self.complete()
 
         try:
-            # status code
-            reason = self.reason if self.reason is not None else \
-                ('OK' if self.status_code == 200 else 'N/A')
-            await stream.awrite('HTTP/1.0 {status_code} {reason}\r\n'.format(
-                status_code=self.status_code, reason=reason).encode())
-
-            # headers
-            for header, value in self.headers.items():
-                values = value if isinstance(value, list) else [value]
-                for value in values:
-                    await stream.awrite('{header}: {value}\r\n'.format(
-                        header=header, value=value).encode())
-            await stream.awrite(b'\r\n')
+            head = self._head()
+            if self.is_head:
+                await stream.awrite(head)
+                return
 
             # body
-            if not self.is_head:
-                iter = self.body_iter()
-                async for body in iter:
-                    if isinstance(body, str):  # pragma: no cover
-                        body = body.encode()
-                    try:
+            iter = self.body_iter()
+            if hasattr(self.body, '__anext__'):
+                # the first chunk of an async generator may take a while
+                await stream.awrite(head)
+                head = None
+            async for body in iter:
+                if isinstance(body, str):  # pragma: no cover
+                    body = body.encode()
+                try:
+                    if head is None:
                         await stream.awrite(body)
-                    except OSError as exc:  # pragma: no cover
-                        if exc.errno in MUTED_SOCKET_ERRORS or \
-                                exc.args[0] == 'Connection lost':
-                            if hasattr(iter, 'aclose'):
-                                await iter.aclose()
-                        raise
-                if hasattr(iter, 'aclose'):  # pragma: no branch
-                    await iter.aclose()
+                    else:
+                        await self._write_head(stream, head, body)
+                        head = None
+                except OSError as exc:  # pragma: no cover
+                    if exc.errno in MUTED_SOCKET_ERRORS or \
+                            exc.args[0] == 'Connection lost':
+                        if hasattr(iter, 'aclose'):
+                            await iter.aclose()
+                    raise
+            if head is not None:
+                await stream.awrite(head)  # no body
+            if hasattr(iter, 'aclose'):  # pragma: no branch
+                await iter.aclose()
 
         except OSError as exc:  # pragma: no cover
             if exc.errno in MUTED_SOCKET_ERRORS or \
@@ -688,6 +802,21 @@ class Response:
             else:
                 raise
 
+    @classmethod
+    def _take_buffer(cls):
+        size = cls.send_file_buffer_size
+        while cls._buffer_pool:
+            buffer = cls._buffer_pool.pop()
+            if len(buffer) == size:
+                return buffer
+        return bytearray(size)
+
+    @classmethod
+    def _release_buffer(cls, buffer):
+        if len(buffer) == cls.send_file_buffer_size and \
+                len(cls._buffer_pool) < cls.send_file_buffer_pool_size:
+            cls._buffer_pool.append(buffer)
+
     def body_iter(self):
         if hasattr(self.body, '__anext__'):
             # response body is an async generator
@@ -700,6 +829,7 @@ class Response:
             ITER_SYNC_GEN = 1
             ITER_FILE_OBJ = 2
             ITER_NO_BODY = -1
+            buffer = None
 
             def __aiter__(self):
                 if response.body:
@@ -715,6 +845,12 @@ class Response:
                 if self.i == self.ITER_UNKNOWN:
                     if hasattr(response.body, 'read'):
                         self.i = self.ITER_FILE_OBJ
+                        if AWRITE_COPIES and \
+                                hasattr(response.body, 'readinto'):
+                            # chunks are views of this buffer, refilled once
+                            # awrite() has copied the previous one
+                            self.buffer = response._take_buffer()
+                            self.view = memoryview(self.buffer)
                     elif hasattr(response.body, '__next__'):
                         self.i = self.ITER_SYNC_GEN
                         return next(response.body)
@@ -727,6 +863,13 @@ class Response:
                     except StopIteration:
                         await self.aclose()
                         raise StopAsyncIteration
+                if self.buffer is not None:
+                    n = response.body.readinto(self.buffer)
+                    if iscoroutine(n):  # pragma: no cover
+                        n = await n
+                    if n < len(self.buffer):
+                        self.i = self.ITER_NO_BODY
+                    return self.view[:n]
                 buf = response.body.read(response.send_file_buffer_size)
                 if iscoroutine(buf):  # pragma: no cover
                     buf = await buf
@@ -735,6 +878,9 @@ class Response:
                 return buf
 
             async def aclose(self):
+                if self.buffer is not None:
+                    response._release_buffer(self.buffer)
+                    self.buffer = self.view = None
                 if hasattr(response.body, 'close'):
                     result = response.body.close()
                     if iscoroutine(result):  # pragma: no cover
@@ -809,6 +955,10 @@ class Response:
             headers['Content-Encoding'] = compressed \
                 if isinstance(compressed, str) else 'gzip'
 
+        if stream is None:
+            # a known length lets the connection be kept alive
+            headers['Content-Length'] = str(
+                os.stat(filename + file_extension)[6])
         f = stream or open(filename + file_extension, 'rb')
         return cls(body=f, status_code=status_code, headers=headers)
 
@@ -883,6 +1033,164 @@ class URLPattern():
         return 'URLPattern: {}'.format(self.url_pattern)
 
 
+class _RouteNode:
+    def __init__(self):
+        self.children = {}  # literal segment -> node
+        self.params = []  # (type, name, node) for string and int segments
+        self.tails = []  # (name, index) for a trailing path segment
+        self.routes = []  # indexes of the routes ending at this node
+
+
+class Router:
+    """An index over an application's URL map.
+
+    Literal URLs are found in a dictionary keyed by method and path, URLs
+    with ``string``, ``int`` and trailing ``path`` segments in a tree walked
+    one path segment at a time. Only URLs with ``re:`` or custom segment
+    types are matched with a regular expression. As with a linear scan of
+    the URL map, the first matching route in registration order wins.
+    """
+    builtin_patterns = {
+        'string': '/([^/]+)',
+        'int': '/(-?\\d+)',
+        'path': '/(.+)',
+    }
+
+    def __init__(self, url_map):
+        self.url_map = url_map
+        self.literal = {}  # (method, path) -> (index, args)
+        self.literal_paths = {}  # path -> [index, ...]
+        self.root = _RouteNode()
+        self.regex = []  # indexes of the routes matched by regex
+        for index, route in enumerate(url_map):
+            self._add(index, route[0], route[1].url_pattern)
+        # a pattern registered earlier can shadow a literal URL, resolve
+        # that once here so that literal lookups never walk the tree
+        for method, path in self.literal:
+            self.literal[(method, path)] = self._find(method, path)[:2]
+
+    def _add(self, index, methods, url_pattern):
+        segments = url_pattern.lstrip('/').split('/')
+        if '<' not in url_pattern:
+            path = '/' + '/'.join(segments)
+            for method in methods:
+                self.literal[(method, path)] = None
+            self.literal_paths.setdefault(path, []).append(index)
+            return
+        specs = []
+        for i, segment in enumerate(segments):
+            if not segment or segment[0] != '<':
+                specs.append((None, segment))
+                continue
+            if segment[-1] != '>':
+                raise ValueError('invalid URL pattern')
+            segment = segment[1:-1]
+            type_, name = segment.rsplit(':', 1) if ':' in segment \
+                else ('string', segment)
+            if type_ not in self.builtin_patterns or \
+                    URLPattern.segment_patterns.get(type_) != \
+                    self.builtin_patterns[type_] or \
+                    (type_ == 'path' and i != len(segments) - 1):
+                self.regex.append(index)
+                return
+            specs.append((type_, name))
+        node = self.root
+        for type_, name in specs:
+            if type_ is None:
+                if name not in node.children:
+                    node.children[name] = _RouteNode()
+                node = node.children[name]
+            elif type_ == 'path':
+                node.tails.append((name, index))
+                return
+            else:
+                for t, n, child in node.params:
+                    if t == type_ and n == name:
+                        node = child
+                        break
+                else:
+                    child = _RouteNode()
+                    node.params.append((type_, name, child))
+                    node = child
+        node.routes.append(index)
+
+    def _walk(self, node, segments, i, args, matches):
+        if i == len(segments):
+            for index in node.routes:
+                matches.append((index, dict(args)))
+            return
+        segment = segments[i]
+        child = node.children.get(segment)
+        if child is not None:
+            self._walk(child, segments, i + 1, args, matches)
+        for type_, name, child in node.params:
+            if not segment:
+                break
+            value = segment
+            if type_ == 'int':
+                digits = segment[1:] if segment[0] == '-' else segment
+                if not digits.isdigit():
+                    continue
+            parser = URLPattern.segment_parsers.get(type_)
+            if parser:
+                value = parser(segment)
+                if value is None:
+                    continue
+            args[name] = value
+            self._walk(child, segments, i + 1, args, matches)
+            del args[name]
+        for name, index in node.tails:
+            value = '/'.join(segments[i:])
+            if not value:
+                break
+            parser = URLPattern.segment_parsers.get('path')
+            if parser:
+                value = parser(value)
+                if value is None:
+                    continue
+            tail_args = dict(args)
+            tail_args[name] = value
+            matches.append((index, tail_args))
+
+    def matches(self, path):
+        """All the routes matching a path, as ``(index, args)`` tuples."""
+        matches = [(index, {}) for index in self.literal_paths.get(path, ())]
+        if path[:1] == '/':
+            self._walk(self.root, path[1:].split('/'), 0, {}, matches)
+        for index in self.regex:
+            args = self.url_map[index][1].match(path)
+            if args is not None:
+                matches.append((index, args))
+        return matches
+
+    def find(self, method, path):
+        """Find the route for a request.
+
+        Returns ``(index, args, True)`` for the first route matching the
+        method and path, ``(index, args, False)`` for the last route matching
+        only the path, or ``(None, None, False)`` when no route matches.
+        """
+        match = self.literal.get((method, path))
+        if match is not None:
+            return match[0], dict(match[1]), True
+        return self._find(method, path)
+
+    def _find(self, method, path):
+        best = None
+        other = None
+        for match in self.matches(path):
+            if method in self.url_map[match[0]][0]:
+                if best is None or match[0] < best[0]:
+                    best = match
+            elif other is None or match[0] > other[0]:
+                other = match
+        if best is not None:
+            return best[0], best[1], True
+        if other is not None:
+            return other[0], other[1], False
+        return None, None, False
+
+
 class HTTPException(Exception):
     def __init__(self, status_code, reason=None):
         self.status_code = status_code
@@ -906,16 +1214,63 @@ class Microdot:
         app = Microdot()
     """
 
+    #: Seconds an idle kept-alive connection waits for its next request
+    #: before it is closed. Set to 0 to close every connection after one
+    #: response, as HTTP/1.0 does.
+    #:
+    #: Example::
+    #:
+    #:    app.keep_alive_timeout = 5
+    keep_alive_timeout = 5
+
+    #: The maximum number of requests served over one connection.
+    keep_alive_max_requests = 20
+
+    #: The maximum number of connections kept alive at the same time, each
+    #: one holds a socket and its buffers. Further connections are closed
+    #: after their response.
+    keep_alive_max_connections = 4
+
+    #: The maximum number of connections served at the same time, or
+    #: ``None`` for no limit. Further connections wait for a free slot for
+    #: up to ``connection_queue_timeout`` seconds, then get a 503 response
+    #: without their request being read.
+    #:
+    #: Example::
+    #:
+    #:    app.max_connections = 8
+    max_connections = None
+
+    #: Seconds a connection waits for a free slot, 0 to reject it at once.
+    connection_queue_timeout = 1
+
+    #: Seconds a client has to send the request line, the headers and a
+    #: body small enough to be read up front. Slower clients are
+    #: disconnected.
+    header_timeout = 10
+
+    #: Seconds a route handler has to return a response, or ``None`` for no
+    #: limit. A handler that runs out of time gets a 503 response. Writing
+    #: the response is not limited, so long streamed bodies and downloads
+    #: to slow clients are not cut off. WebSocket requests are not limited,
+    #: and routes can set their own budget with :meth:`timeout`.
+    request_timeout = None
+
     def __init__(self):
         self.url_map = []
         self.before_request_handlers = []
         self.after_request_handlers = []
         self.after_error_request_handlers = []
         self.error_handlers = {}
+        self.route_timeouts = {}
         self.shutdown_requested = False
         self.options_handler = self.default_options_handler
         self.debug = False
         self.server = None
+        self.keep_alive_connections = 0
+        self.connections = 0
+        self._slot_freed = asyncio.Event()
+        self.router = None
 
     def route(self, url_pattern, methods=None):
         """Decorator that is used to register a function as a request handler
@@ -951,6 +1306,7 @@ class Microdot:
             self.url_map.append(
                 ([m.upper() for m in (methods or ['GET'])],
                  URLPattern(url_pattern), f, '', None))
+            self.router = None  # rebuilt on the next request
             return f
         return decorated
 
@@ -1118,6 +1474,25 @@ class Microdot:
             return f
         return decorated
 
+    def timeout(self, seconds):
+        """Decorator to give a route its own time budget in place of
+        :attr:`request_timeout`.
+
+        :param seconds: The seconds the route has to be handled, or ``None``
+                        for no limit.
+
+        Example::
+
+            @app.post('/upload')
+            @app.timeout(None)
+            async def upload(request):
+                # ...
+        """
+        def decorated(f):
+            self.route_timeouts[f] = seconds
+            return f
+        return decorated
+
     def mount(self, subapp, url_prefix='', local=False):
         """Mount a sub-application, optionally under the given URL prefix.
 
@@ -1132,6 +1507,8 @@ class Microdot:
             self.url_map.append(
                 (methods, URLPattern(url_prefix + pattern.url_pattern),
                  handler, url_prefix + _prefix, _subapp or subapp))
+        self.route_timeouts.update(subapp.route_timeouts)
+        self.router = None
         if not local:
             for handler in subapp.before_request_handlers:
                 self.before_request_handlers.append(handler)
@@ -1305,54 +1682,132 @@ class Microdot:
             return self.options_handler(req), '', None
         if method == 'HEAD':
             method = 'GET'
-        f = 404
-        p = ''
-        s = None
-        for route_methods, route_pattern, route_handler, url_prefix, subapp \
-                in self.url_map:
-            req.url_args = route_pattern.match(req.path)
-            if req.url_args is not None:
-                p = url_prefix
-                s = subapp
-                if method in route_methods:
-                    f = route_handler
-                    break
-                else:
-                    f = 405
-        return f, p, s
+        if self.router is None:
+            self.router = Router(self.url_map)
+        index, req.url_args, allowed = self.router.find(method, req.path)
+        if index is None:
+            return 404, '', None
+        _, _, route_handler, url_prefix, subapp = self.url_map[index]
+        return route_handler if allowed else 405, url_prefix, subapp
 
     def default_options_handler(self, req):
+        if self.router is None:
+            self.router = Router(self.url_map)
         allow = []
-        for route_methods, route_pattern, _, _, _ in self.url_map:
-            if route_pattern.match(req.path) is not None:
-                allow.extend(route_methods)
+        for index, _ in sorted(self.router.matches(req.path)):
+            allow.extend(self.url_map[index][0])
         if 'GET' in allow:
             allow.append('HEAD')
         allow.append('OPTIONS')
         return {'Allow': ', '.join(allow)}
 
-    async def handle_request(self, reader, writer):
-        req = None
+    async def _admit(self):
+        if self.max_connections is not None:
+            start = ticks_ms()
+            timeout = int(self.connection_queue_timeout * 1000)
+            # the slot is checked and taken here, without awaiting in
+            # between, so waiters woken together can't all take it
+            while self.connections >= self.max_connections:
+                remaining = timeout - ticks_diff(ticks_ms(), start)
+                if remaining <= 0:
+                    return False
+                self._slot_freed.clear()
+                try:
+                    await asyncio.wait_for(self._slot_freed.wait(),
+                                           remaining / 1000)
+                except asyncio.TimeoutError:
+                    return False
+        self.connections += 1
+        return True
+
+    async def _reject(self, writer):
+        res = Response('Service unavailable', 503,
+                       {'Retry-After': '1', 'Connection': 'close'})
         try:
-            req = await Request.create(self, reader, writer,
-                                       writer.get_extra_info('peername'))
-        except Exception as exc:  # pragma: no cover
-            print_exception(exc)
+            await res.write(writer)
+            await writer.aclose()
+        except OSError as exc:  # pragma: no cover
+            if exc.errno not in MUTED_SOCKET_ERRORS:
+                raise
 
-        res = await self.dispatch_request(req)
+    async def handle_request(self, reader, writer):
+        if not await self._admit():
+            await self._reject(writer)
+            return
+        requests = 0
+        kept_alive = False
         try:
-            if res != Response.already_handled:  # pragma: no branch
-                await res.write(writer)
-            await writer.aclose()
+            while True:
+                req = None
+                try:
+                    req = await asyncio.wait_for(Request.create(
+                        self, reader, writer,
+                        writer.get_extra_info('peername')),
+                        self.keep_alive_timeout if requests
+                        else self.header_timeout)
+                    if req is None and requests:
+                        break  # the client closed the connection
+                except asyncio.TimeoutError:
+                    break  # idle or too slow
+                except Exception as exc:  # pragma: no cover
+                    print_exception(exc)
+                requests += 1
+
+                res = await self.dispatch_request(req)
+                keep_alive = False
+                if res != Response.already_handled:  # pragma: no branch
+                    keep_alive = self._keep_alive(req, res, requests)
+                    if keep_alive and not kept_alive:
+                        kept_alive = True
+                        self.keep_alive_connections += 1
+                    res.headers['Connection'] = \
+                        'keep-alive' if keep_alive else 'close'
+                    await res.write(writer)
+                if self.debug and req:  # pragma: no cover
+                    print('{method} {path} {status_code}'.format(
+                        method=req.method, path=req.path,
+                        status_code=res.status_code))
+                if not keep_alive:
+                    break
         except OSError as exc:  # pragma: no cover
-            if exc.errno in MUTED_SOCKET_ERRORS:
-                pass
-            else:
+            if exc.errno not in MUTED_SOCKET_ERRORS:
                 raise
-        if self.debug and req:  # pragma: no cover
-            print('{method} {path} {status_code}'.format(
-                method=req.method, path=req.path,
-                status_code=res.status_code))
+        finally:
+            if kept_alive:
+                self.keep_alive_connections -= 1
+            self.connections -= 1
+            self._slot_freed.set()
+            try:
+                await writer.aclose()
+            except OSError as exc:  # pragma: no cover
+                if exc.errno not in MUTED_SOCKET_ERRORS:
+                    raise
+
+    def _keep_alive(self, req, res, requests):
+        if req is None or not self.keep_alive_timeout or \
+                requests >= self.keep_alive_max_requests:
+            return False
+        if requests == 1 and self.keep_alive_connections >= \
+                self.keep_alive_max_connections:
+            return False
+        connection = req.header('Connection', '').lower()
+        if req.http_version == '1.0':
+            if connection != 'keep-alive':
+                return False
+        elif connection == 'close':
+            return False
+        # the next request can only be found after a body that was read in
+        # full, and the client can only find it after a response of known
+        # length
+        if req.content_length > Request.max_body_length:
+            return False
+        res.complete()
+        return 'Content-Length' in res.headers
+
+    def _timeout(self, req, f):
+        if req.header('Upgrade', '').lower() == 'websocket':
+            return None  # lives as long as the connection
+        return self.route_timeouts.get(f, self.request_timeout)
 
     def get_request_handlers(self, req, attr, local_first=True):
         handlers = getattr(self, attr + '_handlers')
@@ -1391,7 +1846,12 @@ class Microdot:
 
                         # invoke the endpoint handler
                         if res is None:
-                            res = await invoke_handler(f, req, **req.url_args)
+                            try:
+                                res = await asyncio.wait_for(
+                                    invoke_handler(f, req, **req.url_args),
+                                    self._timeout(req, f))
+                            except asyncio.TimeoutError:
+                                res = Response('Service unavailable', 503)
 
                         # process the response
                         if isinstance(res, int):
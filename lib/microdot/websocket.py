@@ -1,15 +1,61 @@
+import asyncio
 import binascii
 import hashlib
 from microdot import Request, Response
 from microdot.microdot import MUTED_SOCKET_ERRORS, print_exception
 from microdot.helpers import wraps
 
+# ``unmask(payload, mask)`` XORs a masked websocket payload, given as a
+# ``bytearray``, with its 4 byte masking key in place. On MicroPython the
+# viper version from ``_unmask_viper`` does this 32 bits at a time when it
+# was built for the board (see the Makefile), elsewhere the payload is XORed
+# as a single large integer, which also runs at C speed.
+
+def _unmask_bigint(payload, mask):
+    n = len(payload)
+    if n == 0:
+        return
+    key = (mask * ((n + 3) // 4))[:n]
+    payload[:] = (int.from_bytes(payload, 'big') ^
+                  int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+try:
+    from microdot._unmask_viper import unmask
+except (ImportError, ValueError):  # pragma: no cover
+    # CPython, or a .mpy built for another architecture
+    unmask = _unmask_bigint
+
 
 class WebSocketError(Exception):
     """Exception raised when an error occurs in a WebSocket connection."""
     pass
 
 
+class Frame:
+    """A message encoded once, to be sent to any number of connections.
+
+    :param data: the message, given as a string or bytes. Strings are encoded
+                 to UTF-8 here, once, instead of on every ``send()``.
+    :param opcode: a custom frame opcode to use. If not given, the opcode is
+                   ``TEXT`` or ``BINARY`` depending on the type of the data.
+
+    Example::
+
+        frame = Frame(json.dumps(status))
+        for ws in clients:
+            await ws.send(frame)
+    """
+    __slots__ = ('opcode', 'payload')
+
+    def __init__(self, data, opcode=None):
+        if isinstance(data, str):
+            data = data.encode()
+            opcode = opcode or WebSocket.TEXT
+        self.opcode = opcode or WebSocket.BINARY
+        self.payload = data
+
+
 class WebSocket:
     """A WebSocket connection object.
 
@@ -35,9 +81,28 @@ class WebSocket:
     #:    WebSocket.max_message_length = 4 * 1024  # up to 4KB messages
     max_message_length = -1
 
+    #: Frames with payloads up to this size are copied next to their header
+    #: and written with a single ``awrite()``. Larger payloads are written
+    #: straight from the caller's buffer, after the header.
+    coalesce_size = 256
+
+    #: Seconds between pings sent to the client, or ``None`` to never ping.
+    #: A client that sends nothing back, not even the pong, within
+    #: ``pong_timeout`` seconds of a ping is disconnected. Example::
+    #:
+    #:    WebSocket.ping_interval = 20
+    ping_interval = None
+
+    #: Seconds a client has to answer a ping.
+    pong_timeout = 10
+
     def __init__(self, request):
         self.request = request
         self.closed = False
+        self._alive = True  # something was received since the last ping
+        self._message_opcode = None  # opcode of a fragmented message
+        self._fragments = None
+        self._write_lock = asyncio.Lock()
 
     async def handshake(self):
         response = self._handshake_response()
@@ -49,9 +114,18 @@ class WebSocket:
             b'Sec-WebSocket-Accept: ' + response + b'\r\n\r\n')
 
     async def receive(self):
-        """Receive a message from the client."""
+        """Receive a message from the client.
+
+        Fragmented messages are reassembled before they are returned, up to
+        the maximum message length.
+        """
         while True:
-            opcode, payload = await self._read_frame()
+            fin, opcode, payload = await self._read_frame()
+            self._alive = True
+            if opcode < self.CLOSE:  # data frame, possibly a fragment
+                opcode, payload = self._reassemble(fin, opcode, payload)
+                if opcode is None:
+                    continue
             send_opcode, data = self._process_websocket_frame(opcode, payload)
             if send_opcode:  # pragma: no cover
                 await self.send(data, send_opcode)
@@ -61,15 +135,32 @@ class WebSocket:
     async def send(self, data, opcode=None):
         """Send a message to the client.
 
-        :param data: the data to send, given as a string or bytes.
+        :param data: the data to send, given as a string, bytes or a
+                     :class:`Frame` encoded beforehand.
         :param opcode: a custom frame opcode to use. If not given, the opcode
                        is ``TEXT`` or ``BINARY`` depending on the type of the
                        data.
         """
-        frame = self._encode_websocket_frame(
-            opcode or (self.TEXT if isinstance(data, str) else self.BINARY),
-            data)
-        await self.request.sock[1].awrite(frame)
+        if isinstance(data, Frame):
+            opcode = opcode or data.opcode
+            data = data.payload
+        elif isinstance(data, str):
+            opcode = opcode or self.TEXT
+            data = data.encode()
+        # written data must not change until the stream is done with it
+        # (CPython's StreamWriter may keep a reference to it), so each frame
+        # gets a buffer of its own rather than a reused one
+        length = len(data)
+        n = 2 if length < 126 else 4 if length < (1 << 16) else 10
+        if length <= self.coalesce_size:
+            frame = bytearray(n + length)
+            self._encode_header(frame, opcode or self.BINARY, length)
+            frame[n:] = data
+            await self._write_frame(frame)
+        else:
+            header = bytearray(n)
+            self._encode_header(header, opcode or self.BINARY, length)
+            await self._write_frame(header, data)
 
     async def close(self):
         """Close the websocket connection."""
@@ -77,6 +168,31 @@ class WebSocket:
             self.closed = True
             await self.send(b'', self.CLOSE)
 
+    async def keepalive(self):
+        """Ping the client every ``ping_interval`` seconds and drop the
+        connection when it stops answering.
+
+        The socket is closed under a pending ``receive()`` or ``send()``, so
+        a peer that vanished without closing the connection is noticed in
+        seconds rather than when the TCP stack gives up on it.
+        """
+        while not self.closed:
+            await asyncio.sleep(self.ping_interval)
+            self._alive = False
+            try:
+                # the send itself blocks if the peer stopped reading
+                await asyncio.wait_for(self.send(b'', self.PING),
+                                       self.pong_timeout)
+                await asyncio.sleep(self.pong_timeout)
+            except asyncio.TimeoutError:
+                self._alive = False
+            if not self._alive and not self.closed:
+                self.closed = True
+                try:
+                    await self.request.sock[1].aclose()
+                except Exception:  # pragma: no cover
+                    pass
+
     def _handshake_response(self):
         connection = False
         upgrade = False
@@ -103,8 +219,8 @@ class WebSocket:
     def _parse_frame_header(cls, header):
         fin = header[0] & 0x80
         opcode = header[0] & 0x0f
-        if fin == 0 or opcode == cls.CONT:  # pragma: no cover
-            raise WebSocketError('Continuation frames not supported')
+        if fin == 0 and opcode >= cls.CLOSE:  # pragma: no cover
+            raise WebSocketError('Fragmented control frame')
         has_mask = header[1] & 0x80
         length = header[1] & 0x7f
         if length == 126:
@@ -113,6 +229,31 @@ class WebSocket:
             length = -8
         return fin, opcode, has_mask, length
 
+    def _max_length(self):
+        return Request.max_body_length \
+            if self.max_message_length == -1 else self.max_message_length
+
+    def _reassemble(self, fin, opcode, payload):
+        if opcode == self.CONT:
+            if self._message_opcode is None:
+                raise WebSocketError('Unexpected continuation frame')
+            if len(self._fragments) + len(payload) > self._max_length():
+                self._message_opcode = self._fragments = None
+                raise WebSocketError('Message too large')
+            self._fragments.extend(payload)
+            if not fin:
+                return None, None
+            opcode, payload = self._message_opcode, self._fragments
+            self._message_opcode = self._fragments = None
+            return opcode, payload
+        if self._message_opcode is not None:
+            raise WebSocketError('Expected a continuation frame')
+        if not fin:
+            self._message_opcode = opcode
+            self._fragments = bytearray(payload)
+            return None, None
+        return opcode, payload
+
     def _process_websocket_frame(self, opcode, payload):
         if opcode == self.TEXT:
             payload = payload.decode()
@@ -130,7 +271,7 @@ class WebSocket:
     def _encode_websocket_frame(cls, opcode, payload):
         frame = bytearray()
         frame.append(0x80 | opcode)
-        if opcode == cls.TEXT:
+        if isinstance(payload, str):
             payload = payload.encode()
         if len(payload) < 126:
             frame.append(len(payload))
@@ -143,6 +284,27 @@ class WebSocket:
         frame.extend(payload)
         return frame
 
+    @staticmethod
+    def _encode_header(frame, opcode, length):
+        frame[0] = 0x80 | opcode
+        if length < 126:
+            frame[1] = length
+        elif length < (1 << 16):
+            frame[1] = 126
+            frame[2] = length >> 8
+            frame[3] = length & 0xff
+        else:
+            frame[1] = 127
+            for i in range(8):
+                frame[9 - i] = (length >> (8 * i)) & 0xff
+
+    async def _write_frame(self, *parts):
+        # every frame is written under the lock, so that nothing sent from
+        # another task lands between the two writes of a large frame
+        async with self._write_lock:
+            for part in parts:
+                await self.request.sock[1].awrite(part)
+
     async def _read_frame(self):
         header = await self.request.sock[0].read(2)
         if len(header) != 2:  # pragma: no cover
@@ -154,16 +316,30 @@ class WebSocket:
         elif length == -8:
             length = await self.request.sock[0].read(8)
             length = int.from_bytes(length, 'big')
-        max_allowed_length = Request.max_body_length \
-            if self.max_message_length == -1 else self.max_message_length
-        if length > max_allowed_length:
+        if length > self._max_length():
             raise WebSocketError('Message too large')
         if has_mask:  # pragma: no cover
             mask = await self.request.sock[0].read(4)
-        payload = await self.request.sock[0].read(length)
+        payload = await self._read_payload(length)
         if has_mask:  # pragma: no cover
-            payload = bytes(x ^ mask[i % 4] for i, x in enumerate(payload))
-        return opcode, payload
+            unmask(payload, mask)
+        return fin, opcode, payload
+
+    async def _read_payload(self, length):
+        # read straight into the bytearray that is unmasked and returned
+        stream = self.request.sock[0]
+        if not hasattr(stream, 'readinto'):  # pragma: no cover
+            # CPython's StreamReader
+            return bytearray(await stream.readexactly(length))
+        payload = bytearray(length)
+        view = memoryview(payload)
+        received = 0
+        while received < length:
+            n = await stream.readinto(view[received:])
+            if not n:
+                raise WebSocketError('Websocket connection closed')
+            received += n
+        return payload
 
 
 async def websocket_upgrade(request):
@@ -196,6 +372,9 @@ def websocket_wrapper(f, upgrade_function):
     @wraps(f)
     async def wrapper(request, *args, **kwargs):
         ws = await upgrade_function(request)
+        keepalive = None
+        if ws.ping_interval:
+            keepalive = asyncio.create_task(ws.keepalive())
         try:
             await f(request, ws, *args, **kwargs)
         except OSError as exc:
@@ -206,6 +385,8 @@ def websocket_wrapper(f, upgrade_function):
         except Exception as exc:
             print_exception(exc)
         finally:  # pragma: no cover
+            if keepalive:
+                keepalive.cancel()
             try:
                 await ws.close()
             except Exception:
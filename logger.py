@@ -1,6 +1,7 @@
 import asyncio
-from utils import millis
+from utils import millis, ticks_diff
 from collections import deque
+from array import array
 
 
 class Level:
@@ -18,6 +19,14 @@ level_map = {
     Level.DEBUG: "DEBUG",
 }
 
+name_map = {
+    "NONE": Level.NONE,
+    "ERROR": Level.ERROR,
+    "WARNING": Level.WARNING,
+    "INFO": Level.INFO,
+    "DEBUG": Level.DEBUG,
+}
+
 
 def RED(string):
     return "\033[31m" + string + "\033[0m"
@@ -43,13 +52,26 @@ colour_map = {
 }
 
 global_task = None
+repeats_task = None
 global_deque = deque([], 30)
+flash_log = None
+registry = {}  # tag -> [Logger]
+
+# Repeated message suppression, a small direct-mapped table of recent messages
+DEDUP_SLOTS = 16  # power of 2
+DEDUP_WINDOW = 10_000  # ms
+dedup_keys = array("i", [0] * DEDUP_SLOTS)
+dedup_time = array("i", [0] * DEDUP_SLOTS)
+dedup_count = array("i", [0] * DEDUP_SLOTS)
+dedup_level = bytearray(DEDUP_SLOTS)
+dedup_tag = [None] * DEDUP_SLOTS
+dedup_message = [None] * DEDUP_SLOTS
 
 
 async def publish_task(ws):
     global global_deque
     while True:
-        if len(global_deque) > 0:
+        while len(global_deque) > 0:
             message = global_deque.popleft()
             try:
                 await ws.send(message)
@@ -66,13 +88,107 @@ def publish_log(s: str):
     global_deque.append(s)
 
 
+def emit(level: int, tag: str, message: str):
+    s = f"{level_map[level]} ({millis()}) {tag}: {message}"
+    print(colour_map[level](s))
+    publish_log(s)
+    if flash_log is not None:
+        flash_log.write(s, urgent=level == Level.ERROR)
+
+
+def flush_repeats(slot: int):
+    count = dedup_count[slot]
+    if count > 0:
+        message = f"{dedup_message[slot]} (repeated {count} times)"
+        emit(dedup_level[slot], dedup_tag[slot], message)
+    dedup_count[slot] = 0
+
+
+def flush_expired():
+    """Report the repeats of messages that stopped coming"""
+    now = millis()
+    for slot in range(DEDUP_SLOTS):
+        if dedup_count[slot] > 0 and ticks_diff(now, dedup_time[slot]) >= DEDUP_WINDOW:
+            flush_repeats(slot)
+
+
+async def flush_expired_task():
+    # a flood that stops is otherwise only summarised when its slot is reused
+    while True:
+        await asyncio.sleep(DEDUP_WINDOW / 1000)
+        flush_expired()
+
+
+def start_flush_expired():
+    global repeats_task
+    if repeats_task is None:
+        repeats_task = asyncio.create_task(flush_expired_task())
+
+
+def suppress(level: int, tag: str, message: str) -> bool:
+    key = (hash(message) ^ hash(tag) ^ level) & 0x3FFFFFFF
+    slot = key & (DEDUP_SLOTS - 1)
+    now = millis()
+    elapsed = ticks_diff(now, dedup_time[slot])
+    if (
+        dedup_message[slot] is not None
+        and dedup_keys[slot] == key
+        and dedup_message[slot] == message
+        and 0 <= elapsed < DEDUP_WINDOW
+    ):
+        dedup_count[slot] += 1
+        return True
+
+    # new message or window expired, report what was collapsed
+    flush_repeats(slot)
+    dedup_keys[slot] = key
+    dedup_time[slot] = now
+    dedup_level[slot] = level
+    dedup_tag[slot] = tag
+    dedup_message[slot] = message
+    return False
+
+
+def parse_level(level) -> int | None:
+    if isinstance(level, str):
+        return name_map.get(level.upper())
+    if isinstance(level, int) and Level.NONE <= level <= Level.DEBUG:
+        return level
+    return None
+
+
+def set_tag_level(tag: str, level: int) -> int:
+    """Set the level of every logger with `tag` ("*" for all), returns count"""
+    count = 0
+    for t, loggers in registry.items():
+        if tag != "*" and tag != t:
+            continue
+        for logger in loggers:
+            logger.set_level(level)
+            count += 1
+    return count
+
+
+def get_levels() -> dict:
+    levels = {}
+    for t, loggers in registry.items():
+        levels[t] = level_map.get(loggers[0].level, "NONE")
+    return levels
+
+
 class Logger:
     level = Level.INFO
     cb = None
+    dedup = True
 
-    def __init__(self, tag, level: int = Level.INFO):
+    def __init__(self, tag, level: int = Level.INFO, dedup: bool = True):
         self.tag = tag
         self.level = level
+        self.dedup = dedup
+        if tag in registry:
+            registry[tag].append(self)
+        else:
+            registry[tag] = [self]
 
     def set_level(self, new_level: int = Level.INFO):
         self.level = new_level
@@ -80,9 +196,9 @@ class Logger:
     def log(self, level: int, message: str):
         if level > self.level:
             return
-        s = f"{level_map[level]} ({millis()}) {self.tag}: {message}"
-        print(colour_map[level](s))
-        publish_log(s)
+        if self.dedup and suppress(level, self.tag, message):
+            return
+        emit(level, self.tag, message)
 
     def set_websocket(self, websocket):
         global global_task
@@ -93,15 +209,36 @@ class Logger:
             global_task = None
         else:
             global_task = asyncio.create_task(publish_task(websocket))
+            start_flush_expired()
+
+    def set_flash_log(self, sink):
+        global flash_log
+        if flash_log is not None:
+            flash_log.stop()
+        flash_log = sink
+        if sink is not None:
+            start_flush_expired()
+
+    # Level checks are inlined so disabled calls cost a single comparison.
+    # For expensive messages in hot paths guard the call site as well, e.g.
+    # `if log.level >= Level.DEBUG: log.debug(f"...")`
 
     def error(self, message: str):
+        if self.level < Level.ERROR:
+            return
         self.log(Level.ERROR, message)
 
     def info(self, message: str):
+        if self.level < Level.INFO:
+            return
         self.log(Level.INFO, message)
 
     def debug(self, message: str):
+        if self.level < Level.DEBUG:
+            return
         self.log(Level.DEBUG, message)
 
     def warning(self, message: str):
+        if self.level < Level.WARNING:
+            return
         self.log(Level.WARNING, message)
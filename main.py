@@ -1,3 +1,11 @@
+from bundle import resume
+
+if resume():
+    # an update was finished after some of the old modules were imported
+    import machine
+
+    machine.reset()
+
 from app import run
 from connect import connect
 from time import sleep
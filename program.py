@@ -54,6 +54,28 @@ class Program:
 
         return None
 
+    def seek(self, runtime, temp):
+        """Runtime to resume a firing at, given the kiln temperature.
+
+        If the kiln cooled below the setpoint at `runtime` (e.g. while the
+        controller was off), go back along the rising part of the program to
+        where it passes `temp`, instead of jumping straight to the setpoint.
+        """
+        setpoint = self.get_setpoint(runtime)
+        if setpoint is None or temp is None or temp >= setpoint:
+            return runtime
+        for i in range(len(self.instructions) - 1, -1, -1):
+            inst = self.instructions[i]
+            last = self.instructions[i - 1] if i > 0 else Instruction(0, 0)
+            if last.time >= runtime:
+                continue
+            if inst.temp < last.temp:
+                break  # never go back past a cooling segment
+            if inst.temp > last.temp and last.temp <= temp:
+                ratio = (temp - last.temp) / (inst.temp - last.temp)
+                return min(runtime, last.time + ratio * (inst.time - last.time))
+        return runtime
+
 
 def serialize(obj):
     if isinstance(obj, Program):
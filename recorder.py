@@ -0,0 +1,343 @@
+import asyncio
+import os
+import struct
+import time
+from logger import Logger
+from microdot.microdot import AWRITE_COPIES
+from utils import decode_name, encode_name, millis, ticks_add, ticks_diff
+
+log = Logger(__name__)
+
+# Firing trace file:
+#   header, HEADER_SIZE bytes: magic, version, block size, start time
+#     (time.time() of the device), sample interval (ms), program name
+#   then fixed size blocks, each starting with a BLOCK_HEADER (time of its
+#   first sample, sample count, bytes used) followed by the samples as
+#   zigzag varints: the first sample absolute, every other one a delta from
+#   the previous sample. Blocks decode on their own, so seeking by time is a
+#   binary search over the block headers.
+MAGIC = b"MPPR"
+VERSION = 1
+HEADER = "<4sBxHIH32s"
+HEADER_SIZE = 64
+BLOCK_HEADER = "<IHH"
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_HEADER)
+BLOCK_SIZE = 512
+
+# Sample columns, stored as int(value * scale): time since the start in
+# 0.1 s, temp and target in 0.25 C, duty in 0.1 %, current in 10 mA
+COLUMNS = ("time", "temp", "target", "duty", "current")
+SCALES = (10, 4, 4, 1000, 100)
+MISSING = -0x8000  # stored instead of None
+MAX_SAMPLE_SIZE = 5 * len(COLUMNS)
+
+
+def zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def put_varint(buffer, pos: int, value: int) -> int:
+    value = zigzag(value)
+    while value >= 0x80:
+        buffer[pos] = (value & 0x7F) | 0x80
+        value >>= 7
+        pos += 1
+    buffer[pos] = value
+    return pos + 1
+
+
+def get_varint(buffer, pos: int):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return unzigzag(value), pos
+        shift += 7
+
+
+def quantise(value, scale) -> int:
+    if value is None or value != value:
+        return MISSING
+    return int(round(value * scale))
+
+
+def read_header(file) -> dict:
+    file.seek(0)
+    data = file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Not a firing trace")
+    magic, version, block_size, start, interval, name = struct.unpack_from(
+        HEADER, data
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a firing trace")
+    return {
+        "block_size": block_size,
+        "start": start,
+        "interval": interval,
+        "name": decode_name(name),
+    }
+
+
+def block_count(file, block_size: int) -> int:
+    file.seek(0, 2)
+    return (file.tell() - HEADER_SIZE + block_size - 1) // block_size
+
+
+def block_time(file, block_size: int, index: int) -> int:
+    file.seek(HEADER_SIZE + index * block_size)
+    return struct.unpack(BLOCK_HEADER, file.read(BLOCK_HEADER_SIZE))[0]
+
+
+def seek_block(file, block_size: int, since: int) -> int:
+    """Index of the block holding the first sample after `since` (0.1 s)"""
+    lo = 0
+    hi = block_count(file, block_size)
+    # last block starting at or before `since`
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if block_time(file, block_size, mid) <= since:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def decode_block(block):
+    """Yield the samples of a block as tuples of stored integers"""
+    _, count, used = struct.unpack_from(BLOCK_HEADER, block)
+    pos = BLOCK_HEADER_SIZE
+    sample = [0] * len(COLUMNS)
+    for _ in range(count):
+        for c in range(len(COLUMNS)):
+            delta, pos = get_varint(block, pos)
+            sample[c] += delta
+        yield tuple(sample)
+
+
+class Recorder:
+    """Records the telemetry of each firing to its own compressed file.
+
+    Samples are encoded into a page sized RAM block which is written when it
+    fills up, or rewritten in place every `flush_interval` seconds so at most
+    that much of a firing is lost on power failure.
+    """
+
+    def __init__(
+        self,
+        directory: str = "firings",
+        interval: float = 2.0,
+        flush_interval: float = 30.0,
+        max_files: int = 20,
+    ):
+        self.directory = directory
+        self.interval = int(interval * 1000)
+        self.flush_interval = flush_interval
+        self.max_files = max_files
+        self.block = bytearray(BLOCK_SIZE)
+        self.path = None
+        self.number = 0
+        self.task = None
+        self.block_index = 0
+        self.count = 0
+        self.used = BLOCK_HEADER_SIZE
+        self.start_ms = 0
+        self.last_ms = 0
+        self.last = [0] * len(COLUMNS)
+        self.dirty = False
+
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # already exists
+
+    def files(self) -> list:
+        """Trace files, oldest first"""
+        names = [f for f in os.listdir(self.directory) if f.endswith(".bin")]
+        names.sort()
+        return names
+
+    def begin(self, name: str = None):
+        if self.path is not None:
+            self.end()
+        files = self.files()
+        while len(files) >= self.max_files:
+            os.remove(f"{self.directory}/{files.pop(0)}")
+        self.number = int(files[-1].split(".")[0]) + 1 if files else 0
+        self.path = f"{self.directory}/{self.number:05d}.bin"
+
+        header = bytearray(HEADER_SIZE)
+        name = encode_name(name, 32)
+        struct.pack_into(
+            HEADER,
+            header,
+            0,
+            MAGIC,
+            VERSION,
+            BLOCK_SIZE,
+            int(time.time()),
+            min(self.interval, 0xFFFF),
+            name,
+        )
+        try:
+            with open(self.path, "wb") as file:
+                file.write(header)
+        except OSError as e:
+            log.error(f"Error creating firing record: {e}")
+            self.path = None
+            return
+
+        self.start_ms = millis()
+        self.last_ms = ticks_add(self.start_ms, -self.interval)
+        self.block_index = 0
+        self.new_block()
+        self.task = asyncio.create_task(self.run())
+        log.info(f"Recording firing to {self.path}")
+
+    def reopen(self, number: int) -> bool:
+        """Append to the trace file `number`, the firing it holds resumes
+        after the last sample that made it to flash.
+        """
+        if self.path is not None:
+            self.end()
+        path = f"{self.directory}/{number:05d}.bin"
+        try:
+            with open(path, "rb") as file:
+                block_size = read_header(file)["block_size"]
+                blocks = block_count(file, block_size)
+                if blocks:
+                    file.seek(HEADER_SIZE + (blocks - 1) * block_size)
+                    data = file.read(block_size)
+        except (OSError, ValueError) as e:
+            log.error(f"Error reopening firing record {path}: {e}")
+            return False
+        if block_size != BLOCK_SIZE:
+            log.error(f"Firing record {path} has {block_size} byte blocks")
+            return False
+
+        self.path = path
+        self.number = number
+        self.new_block()
+        self.block_index = 0
+        elapsed = 0
+        if blocks:
+            self.block_index = blocks - 1
+            self.block[: len(data)] = data
+            _, self.count, used = struct.unpack_from(BLOCK_HEADER, self.block)
+            self.used = max(used, BLOCK_HEADER_SIZE)
+            for sample in decode_block(self.block):
+                self.last = list(sample)
+            if self.count:
+                elapsed = self.last[0] * 100 + self.interval
+        # the time the device was off is left out of the trace
+        self.start_ms = ticks_add(millis(), -elapsed)
+        self.last_ms = ticks_add(millis(), -self.interval)
+        self.task = asyncio.create_task(self.run())
+        log.info(f"Recording firing to {self.path}, resumed at {elapsed // 1000}s")
+        return True
+
+    def end(self):
+        if self.path is None:
+            return
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.flush()
+        log.info(f"Firing record {self.path} closed")
+        self.path = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def new_block(self):
+        self.count = 0
+        self.used = BLOCK_HEADER_SIZE
+        self.last = [0] * len(COLUMNS)
+        self.dirty = False
+
+    def record(self, info: dict):
+        if self.path is None:
+            return
+        now = millis()
+        if ticks_diff(now, self.last_ms) < self.interval:
+            return
+        self.last_ms = now
+
+        if self.used + MAX_SAMPLE_SIZE > BLOCK_SIZE:
+            self.flush()
+            self.block_index += 1
+            self.new_block()
+
+        values = (
+            ticks_diff(now, self.start_ms) // 100,
+            quantise(info["temp"], SCALES[1]),
+            quantise(info["target"], SCALES[2]),
+            quantise(info["duty"], SCALES[3]),
+            quantise(info["current"], SCALES[4]),
+        )
+        if self.count == 0:
+            struct.pack_into(BLOCK_HEADER, self.block, 0, values[0], 0, 0)
+        pos = self.used
+        for c in range(len(COLUMNS)):
+            pos = put_varint(self.block, pos, values[c] - self.last[c])
+            self.last[c] = values[c]
+        self.used = pos
+        self.count += 1
+        self.dirty = True
+
+    def flush(self):
+        if not self.dirty or self.path is None:
+            return
+        struct.pack_into("<HH", self.block, 4, self.count, self.used)
+        # zero the tail, a rewritten block may have held more before
+        for i in range(self.used, BLOCK_SIZE):
+            self.block[i] = 0
+        try:
+            with open(self.path, "r+b") as file:
+                file.seek(HEADER_SIZE + self.block_index * BLOCK_SIZE)
+                file.write(self.block)
+        except OSError as e:
+            log.error(f"Error writing firing record: {e}")
+        self.dirty = False
+
+    def stream(self, name: str, since: int = 0):
+        """Generator over a trace file, the header followed by the blocks from
+        the one containing `since` (0.1 s after the start) onwards.
+
+        The file is opened straight away, so a missing or invalid file raises
+        here rather than part way through a response.
+        """
+        if self.path is not None and self.path.endswith("/" + name):
+            self.flush()
+        file = open(f"{self.directory}/{name}", "rb")
+        try:
+            block_size = read_header(file)["block_size"]
+            index = seek_block(file, block_size, since) if since > 0 else 0
+        except Exception:
+            file.close()
+            raise
+        return self.blocks(file, block_size, index)
+
+    def blocks(self, file, block_size: int, index: int):
+        with file:
+            file.seek(0)
+            yield file.read(HEADER_SIZE)
+            file.seek(HEADER_SIZE + index * block_size)
+            # the buffer is reused, which is only safe where awrite() copies
+            # each chunk before the next one is read
+            block = bytearray(block_size)
+            view = memoryview(block)
+            while True:
+                n = file.readinto(block)
+                if not n:
+                    break
+                yield view[:n] if AWRITE_COPIES else bytes(view[:n])
@@ -1,14 +1,18 @@
-from microdot import Microdot, send_file, Request
-from microdot.websocket import with_websocket
+from microdot import Microdot, send_file, Request, Response
+from microdot.websocket import with_websocket, WebSocket
 import ujson as json
 from settings import Settings
 from logger import Logger, Level
+from broadcast import Hub
+from assets import Assets, accepts_gzip
+from upload import Receiver, UploadError
+from bundle import Installer, BundleError
+import logger
 import os
 import sys
 
 log = Logger(__name__, level=Level.INFO)
 app = Microdot()
-websocket = None
 server = None
 PORT = 80
 
@@ -16,16 +20,39 @@ PORT = 80
 class Server:
     port = PORT
     controller = None
-    compression = False
+    history = None
 
-    def __init__(self, controller=None, port=PORT):
+    def __init__(self, controller=None, port=PORT, history=None):
         self.port = port
         self.controller = controller
+        self.history = history
         global server
         server = self
 
         settings = Settings()
         Request.max_content_length = settings.ui.MaxContentLengthInKB * 1024  # in KB
+        # dead clients (e.g. a phone that left the WiFi) are dropped quickly
+        WebSocket.ping_interval = settings.ui.WebSocketPingInterval
+        WebSocket.pong_timeout = settings.ui.WebSocketPongTimeout
+        WebSocket.max_message_length = settings.ui.WebSocketMaxMessageInKB * 1024
+        # a page load reuses a few connections instead of one per file
+        app.keep_alive_timeout = settings.ui.KeepAliveTimeout
+        app.keep_alive_max_requests = settings.ui.KeepAliveMaxRequests
+        app.keep_alive_max_connections = settings.ui.KeepAliveMaxConnections
+        # bound the sockets and time the web server can take from the control loop
+        app.max_connections = settings.ui.MaxConnections
+        app.connection_queue_timeout = settings.ui.ConnectionQueueTimeout
+        app.header_timeout = settings.ui.HeaderTimeout
+        app.request_timeout = settings.ui.RequestTimeout
+        Response.send_file_buffer_size = settings.ui.SendFileBufferSize
+        self.receiver = Receiver(buffer_size=settings.ui.UploadBufferSize)
+        self.installer = Installer(self.receiver)
+        self.hub = Hub(
+            max_clients=settings.ui.MaxClients,
+            queue_size=settings.ui.ClientQueueSize,
+            max_dropped=settings.ui.ClientMaxDropped,
+            keyframe_interval=settings.ui.TelemetryKeyframeInterval,
+        )
 
         self.command_lookup = {
             "start": self.controller.start,
@@ -36,27 +63,33 @@ class Server:
             "reboot": lambda: sys.exit(0),
         }
 
-        try:
-            open("static/index.html.gz", "r").close()
-            self.compression = True
-            log.info("Using gzipped index.html")
-        except FileNotFoundError:
-            self.compression = False
-            log.info("Using uncompressed index.html")
+        # which static files exist, gzipped or not, and their ETags
+        self.assets = Assets(
+            cache_size=settings.ui.AssetCacheInKB * 1024,
+            cache_max_file=settings.ui.AssetCacheMaxFileInKB * 1024,
+        )
 
     async def start_server(self):
         log.info(f"Server running: http://localhost:{self.port}")
+        log.set_websocket(self.hub)
         await app.start_server(port=self.port)
 
-    async def push(self, data) -> bool:
-        if websocket:
-            try:
-                await websocket.send(data)
-                return True
-            except Exception as e:
-                log.debug(f"Error sending data: {e}")
-                return False
-        return False
+    def push(self, info: dict) -> bool:
+        # queued per client, slow clients can't stall the control loop
+        return self.hub.publish(info)
+
+    def log_level_handler(self, data) -> bool:
+        if not isinstance(data, dict):
+            log.error(f"Invalid log level request: {data}")
+            return False
+        tag = data.get("tag", "*")
+        level = logger.parse_level(data.get("level"))
+        if level is None:
+            log.error(f"Invalid log level: {data.get('level')}")
+            return False
+        count = logger.set_tag_level(tag, level)
+        log.info(f"Log level of '{tag}' set to {data.get('level')} ({count} loggers)")
+        return count > 0
 
     def command_handler(self, command):
         if command in self.command_lookup:
@@ -70,26 +103,29 @@ class Server:
 @with_websocket
 async def echo(request, ws):
     log.info("WebSocket connection established")
-    global websocket
-    websocket = ws
-    log.set_websocket(ws)
-    while True:
-        data = await ws.receive()
-        try:
-            data = json.loads(data)
-            if "command" in data:
-                command = data["command"]
-                log.info(f"Command received: {command}")
-                server.command_handler(command)
-                await server.push(json.dumps(server.controller.info()))
-
-        except ValueError:
-            log.error(f"Invalid JSON received: {data}")
-            continue
-
-    log.info("WebSocket connection closed")
-    log.set_callback(None, local=False)
-    websocket = None
+    client = server.hub.add(ws)
+    try:
+        while True:
+            data = await ws.receive()
+            try:
+                data = json.loads(data)
+                if "command" in data:
+                    command = data["command"]
+                    log.info(f"Command received: {command}")
+                    server.command_handler(command)
+                    server.push(server.controller.info())
+                if "telemetry" in data:
+                    client.negotiate(data["telemetry"], data.get("delta", False))
+                    log.debug(f"Telemetry format: {data['telemetry']}")
+                if "log_level" in data:
+                    server.log_level_handler(data["log_level"])
+
+            except ValueError:
+                log.error(f"Invalid JSON received: {data}")
+                continue
+    finally:
+        server.hub.remove(client)
+        log.info("WebSocket connection closed")
 
 
 @app.route("/progs")
@@ -99,6 +135,80 @@ async def progs(request):
     return json.dumps(progs)
 
 
+@app.route("/logs")
+async def logs(request):
+    if logger.flash_log is None:
+        return "Flash log not enabled", 404
+    # streamed from flash in small chunks, never the whole file in RAM
+    return logger.flash_log.stream(), 200, {"Content-Type": "text/plain"}
+
+
+@app.route("/history")
+async def history(request):
+    if server.history is None:
+        return "History not enabled", 404
+    try:
+        since = int(request.args.get("since", 0))
+        points = request.args.get("points")
+        points = int(points) if points is not None else None
+    except ValueError:
+        return "Invalid since or points", 400
+    return (
+        server.history.stream(since, points),
+        200,
+        {"Content-Type": "application/json"},
+    )
+
+
+@app.route("/firings")
+async def firings(request):
+    return json.dumps(server.controller.recorder.files())
+
+
+@app.route("/catalogue")
+async def catalogue(request):
+    try:
+        page = int(request.args.get("page", 0))
+        per_page = max(1, min(int(request.args.get("count", 20)), 50))
+    except ValueError:
+        return "Invalid page or count", 400
+    return json.dumps(server.controller.catalogue.page(page, per_page))
+
+
+@app.route("/firings/<name>")
+async def firing(request, name):
+    if "/" in name or ".." in name:
+        return "Not found", 404
+    try:
+        since = int(float(request.args.get("since", 0)) * 10)  # 0.1 s units
+    except ValueError:
+        return "Invalid since", 400
+    try:
+        stream = server.controller.recorder.stream(name, since)
+    except (OSError, ValueError):
+        return "Not found", 404
+    return (
+        stream,
+        200,
+        {"Content-Type": "application/octet-stream"},
+    )
+
+
+@app.route("/loglevel")
+async def get_log_level(request):
+    return json.dumps(logger.get_levels())
+
+
+@app.post("/loglevel")
+async def set_log_level(request):
+    data = request.json
+    if data is None:
+        return "No log level provided", 400
+    if not server.log_level_handler(data):
+        return "Invalid log level or tag", 400
+    return "Log level set", 200
+
+
 @app.route("/load/<name>")
 async def load(request, name):
     server.controller.set_program(name)
@@ -148,10 +258,14 @@ def mkdirdashp(path: str):
 
 
 @app.post("/upload")
+@app.timeout(None)  # reads the whole body, however long it takes
 async def upload(request):
     # obtain the filename and size from request headers
-    filename = request.headers["Content-Disposition"].split("filename=")[1].strip('"')
-    size = int(request.headers["Content-Length"])
+    filename = request.header("Content-Disposition").split("filename=")[1].strip('"')
+    size = request.content_length
+    if request.header("Content-Length") is None:
+        # the body can't be told from an empty file
+        return "Content-Length required", 411
 
     if ".." in filename:
         # directory traversal is not allowed
@@ -168,21 +282,75 @@ async def upload(request):
         log.error(f"Error creating directory: {e}")
         return "Error creating directory", 500
 
-    # write the file to the files directory in 1K chunks
-    with open(filename, "wb") as f:
-        while size > 0:
-            chunk = await request.stream.read(min(size, 1024))
-            f.write(chunk)
-            size -= len(chunk)
+    # checksums the client computed, if any
+    try:
+        crc32 = request.header("X-Content-CRC32")
+        crc32 = int(crc32, 16) if crc32 else None
+    except ValueError:
+        return "Invalid X-Content-CRC32", 400
 
-    log.info("Successfully saved file: " + filename)
+    # the old file stays in place until the whole upload arrived intact
+    try:
+        result = await server.receiver.receive(
+            request.stream,
+            filename,
+            size,
+            crc32=crc32,
+            sha256=request.header("X-Content-SHA256"),
+        )
+    except UploadError as e:
+        log.error(f"Upload of {filename} failed: {e}")
+        return str(e), 400
+    except OSError as e:
+        log.error(f"Error writing {filename}: {e}")
+        return "Error writing file", 500
+
+    server.assets.update(filename)
     if filename == "settings.json":
         log.info("Reloading settings")
         settings = Settings()
         settings.load()
         settings.save()  # apply defaults
         settings.load()
-    return "File uploaded successfully", 200
+    return result
+
+
+@app.post("/bundle")
+@app.timeout(None)  # reads the body, then installs it
+async def bundle(request):
+    # a tar(.gz) of the build tree, see tools/make_bundle.py
+    if request.header("Content-Length") is None:
+        return "Content-Length required", 411
+    if server.installer.busy:
+        return "Another update is in progress", 409
+    # claimed before the body arrives, a second upload would write over it
+    server.installer.busy = True
+    path = "bundle.tar"
+    try:
+        result = await server.receiver.receive(
+            request.stream,
+            path,
+            request.content_length,
+            sha256=request.header("X-Content-SHA256"),
+        )
+        paths = await server.installer.install(path)
+    except (UploadError, BundleError) as e:
+        log.error(f"Bundle rejected: {e}")
+        return str(e), 400
+    except OSError as e:
+        log.error(f"Error installing bundle: {e}")
+        return "Error installing bundle", 500
+    finally:
+        server.installer.busy = False
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    for path in paths:
+        server.assets.update(path)
+    result["files"] = len(paths)
+    return result
 
 
 @app.post("/delete")
@@ -193,6 +361,7 @@ async def delete(request):
     path = data["path"]
     try:
         os.remove(path)
+        server.assets.remove(path)
         log.info(f"Deleted file: {path}")
         return "File deleted successfully"
     except FileNotFoundError:
@@ -203,6 +372,12 @@ async def delete(request):
         return "Error deleting file", 500
 
 
+@app.route("/assets")
+async def assets(request):
+    # static file cache hit/miss counters, for tuning AssetCacheInKB
+    return server.assets.stats()
+
+
 @app.route("/<path:path>")
 async def static(request, path):
     log.debug(f"Requested path: {path}")
@@ -213,18 +388,61 @@ async def static(request, path):
         # if the path ends with a slash, serve index.html
         path += "index.html"
 
-    filetype = path.split(".")[-1]
+    served = server.assets.select(
+        path, accepts_gzip(request.header("Accept-Encoding"))
+    )
+    if served is None:
+        log.error(f"'{path}' is only stored gzipped, the client can't accept it")
+        return "Not acceptable", 406
+    compressed = served != path
+
+    headers = {}
+    if server.assets.has_gzip(path):
+        headers["Vary"] = "Accept-Encoding"
+    etag = server.assets.etag(served)
+    if etag is not None:
+        headers["ETag"] = f'"{etag}"'
+        if etag_matches(request.header("If-None-Match"), etag):
+            return "", 304, headers
 
     log.debug(f"Serving file: {path}")
     try:
-        if server.compression and filetype in ["html", "css", "js"]:
-            return send_file(path, compressed=True, file_extension=".gz")
+        # small hot files come from RAM rather than flash, the memoryview is
+        # passed as the stream so send_file only fills in the headers
+        data = server.assets.read(served)
+        if data is not None:
+            response = send_file(path, compressed=compressed, stream=data)
+            response.headers["Content-Length"] = str(len(data))
+        elif compressed:
+            response = send_file(path, compressed=True, file_extension=".gz")
         else:
-            return send_file(path)
+            response = send_file(path)
     except Exception as e:
         log.error(f"Error sending '{path}': {e}")
+        return "File Not found", 404
+
+    response.headers.update(headers)
+    if etag is not None:
+        if request.args.get("v") == etag:
+            # the URL names this exact content, it can never change
+            response.headers["Cache-Control"] = "max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+    return response
 
-    return "File Not found", 404
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
 
 
 @app.route("/")
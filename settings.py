@@ -15,6 +15,7 @@ class Settings:
             self.PoM: bool = True
             self.MinOnTime: float = 0.05
             self.MaxDuty: float = 0.75
+            self.CheckpointInterval: float = 60.0
 
     class Pinout:
         def __init__(self):
@@ -34,11 +35,45 @@ class Settings:
             self.CTRating: float = 30
             self.CTSampleRate: float = 1200
             self.CTSampleCount: int = 1000
+            self.CTVoltage: float = 230
 
     class UI:
         def __init__(self):
             self.Refresh: float = 1.0
             self.MaxContentLengthInKB = 1024
+            self.MaxClients: int = 4
+            self.ClientQueueSize: int = 8
+            self.ClientMaxDropped: int = 32
+            self.TelemetryKeyframeInterval: int = 30
+            self.WebSocketPingInterval: float = 20.0
+            self.WebSocketPongTimeout: float = 10.0
+            self.WebSocketMaxMessageInKB: int = 4
+            self.KeepAliveTimeout: float = 5.0
+            self.KeepAliveMaxRequests: int = 20
+            self.KeepAliveMaxConnections: int = 3
+            self.SendFileBufferSize: int = 1024
+            self.UploadBufferSize: int = 2048
+            self.AssetCacheInKB: int = 16
+            self.AssetCacheMaxFileInKB: int = 8
+            self.MaxConnections: int = 8
+            self.ConnectionQueueTimeout: float = 1.0
+            self.HeaderTimeout: float = 5.0
+            self.RequestTimeout: float = 30.0
+            self.HistorySize: int = 600
+            self.History10sSize: int = 360
+            self.History60sSize: int = 720
+
+    class Log:
+        def __init__(self):
+            self.FlashLogFiles: int = 4
+            self.FlashLogFileSizeInKB: int = 16
+            self.FlashLogFlushInterval: float = 5.0
+
+    class Recorder:
+        def __init__(self):
+            self.RecordInterval: float = 2.0
+            self.RecordFlushInterval: float = 30.0
+            self.RecordMaxFirings: int = 20
 
     def __new__(cls):
         global settings
@@ -49,6 +84,8 @@ class Settings:
             settings.wifi = cls.Wifi()
             settings.ct = cls.CT()
             settings.ui = cls.UI()
+            settings.log = cls.Log()
+            settings.recorder = cls.Recorder()
             settings.load()
         return settings
 
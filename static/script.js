@@ -26,12 +26,36 @@ class ControllerState {
       this.d = data.d || 0;
       return;
    }
+
+   /**
+    * @brief  Merge a (partial) status update into the state, a null field
+    *         (no reading, e.g. the thermocouple is unplugged) is kept as null
+    * @param {object} data: The changed fields
+    * @return None
+    */
+   update(data) {
+      for (const key in data) {
+         // fields missing from a delta keep the last value
+         if (key in this && data[key] !== undefined) {
+            this[key] = data[key];
+         }
+      }
+   }
 }
 
 //------------------------------------------------------------------------------
 // Module constant defines
 //------------------------------------------------------------------------------
 
+// Binary telemetry frame, must match telemetry.py
+const TELEMETRY_VERSION = 2;
+const TELEMETRY_HEADER_SIZE = 3;
+const TELEMETRY_RUNNING = 0x01;
+const TELEMETRY_PAUSED = 0x02;
+const HISTORY_POINTS = 2000; // the device picks a resolution to fit this
+
+const TELEMETRY_KEYS = ["runtime", "temp", "target", "duty", "current", "p", "i", "d"];
+
 //------------------------------------------------------------------------------
 // Module global variables
 //------------------------------------------------------------------------------
@@ -39,6 +63,7 @@ class ControllerState {
 var g_ws = null;
 var g_settings = {};
 var g_prog = {};
+var g_timeOffset = null; // local time - device millis, once known
 
 var state = new ControllerState({});
 
@@ -75,6 +100,85 @@ function generateSamples() {
 }
 
 
+/**
+ * @brief  Decode a binary telemetry frame
+ * @param {ArrayBuffer} buffer: The frame
+ * @return {object|null} The fields present in the frame, null if not understood
+ */
+function decodeTelemetry(buffer) {
+   if (buffer.byteLength < TELEMETRY_HEADER_SIZE) {
+      return null;
+   }
+   const view = new DataView(buffer);
+   if (view.getUint8(0) != TELEMETRY_VERSION) {
+      return null;
+   }
+   const flags = view.getUint8(1);
+   const mask = view.getUint8(2);
+   const status = {
+      running: (flags & TELEMETRY_RUNNING) != 0,
+      paused: (flags & TELEMETRY_PAUSED) != 0,
+   };
+   var offset = TELEMETRY_HEADER_SIZE;
+   for (var i = 0; i < TELEMETRY_KEYS.length; i++) {
+      if ((mask & (1 << i)) == 0) {
+         continue;
+      }
+      const value = view.getFloat32(offset, true);
+      status[TELEMETRY_KEYS[i]] = isNaN(value) ? null : value;
+      offset += 4;
+   }
+   return status;
+}
+
+/**
+ * @brief  Fetch the samples the device recorded while we were disconnected
+ * @param  None
+ * @return None
+ */
+function backfillHistory() {
+   var since = 0;
+   if (g_timeOffset != null) {
+      const x = traces[0].x;
+      since = Math.floor(x[x.length - 1].getTime() - g_timeOffset);
+   }
+   const requested = Date.now();
+   fetch('/history?since=' + since + '&points=' + HISTORY_POINTS)
+      .then(response => response.json())
+      .then(data => {
+         const received = Date.now();
+         g_timeOffset = (requested + received) / 2 - data.now;
+         insertSamples(data.samples);
+      })
+      .catch(error => {
+         console.error('Error fetching history:', error);
+      });
+}
+
+/**
+ * @brief  Insert history samples into the plot, in time order
+ * @param {Array} samples: [[time, temp, target, duty, current], ...]
+ * @return None
+ */
+function insertSamples(samples) {
+   if (samples.length == 0) {
+      return;
+   }
+   const x = samples.map(sample => new Date(sample[0] + g_timeOffset));
+   // live samples may have arrived while the request was in flight
+   var index = traces[0].x.length;
+   while (index > 0 && traces[0].x[index - 1] > x[0]) {
+      index--;
+   }
+   traces[0].x.splice(index, 0, ...x);
+   traces[0].y.splice(index, 0, ...samples.map(sample => sample[1]));
+   traces[1].x.splice(index, 0, ...x);
+   traces[1].y.splice(index, 0, ...samples.map(sample => sample[2]));
+   traces[2].x.splice(index, 0, ...x);
+   traces[2].y.splice(index, 0, ...samples.map(sample => sample[4]));
+   Plotly.redraw('canvas');
+}
+
 /**
    * @brief  Connect to the WebSocket server
    * @param  None
@@ -82,15 +186,27 @@ function generateSamples() {
    */
 function connect() {
    ws = new WebSocket('ws://' + location.host + '/ws');
+   ws.binaryType = "arraybuffer";
    ws.onopen = function() {
       console.log('Socket is open');
       setStatus("Connected", "green");
+      // ask for compact binary deltas, older firmware ignores this
+      ws.send(JSON.stringify({ telemetry: "binary", delta: true }));
+      backfillHistory();
    };
 
    ws.onmessage = function(e) {
+      if (e.data instanceof ArrayBuffer) {
+         const status = decodeTelemetry(e.data);
+         if (status) {
+            state.update(status);
+            updateReadings(state);
+         }
+         return;
+      }
       try {
          const status = JSON.parse(e.data);
-         state = new ControllerState(status);
+         state.update(status);
          updateReadings(state);
       }
       catch {
@@ -196,19 +312,41 @@ function round(value, decimals) {
    return Number(Math.round(value + 'e' + decimals) + 'e-' + decimals);
 }
 
+/**
+ * @brief  Format a reading, "--" when there is none
+ * @param {number|null} value: The reading
+ * @param {number} decimals: The number of decimals to round to
+ * @param {string} unit: The unit appended to the value
+ * @return {string} The formatted reading
+ */
+function reading(value, decimals, unit) {
+   if (value === null) {
+      return "--";
+   }
+   return round(value, decimals) + unit;
+}
+
 /**
  * @brief  Update the readings on the page
  * @param {ControllerState} status: The power supply status
  * @return None
  */
 function updateReadings(status) {
-   document.getElementById("temp").innerHTML = "Temperature: " + round(status.temp, 0) + '°C';
-   document.getElementById("target").innerHTML = "Target: " + round(status.target, 0) + '°C';
-   document.getElementById("current").innerHTML = "Current: " + round(status.current, 1) + 'A';
-   document.getElementById("duty").innerHTML = "Duty: " + round(status.duty * 100, 1) + '%';
-   document.getElementById("p").innerHTML = "P: " + round(status.p, 3);
-   document.getElementById("i").innerHTML = "I: " + round(status.i, 3);
-   document.getElementById("d").innerHTML = "D: " + round(status.d, 3);
+   const temp = document.getElementById("temp");
+   if (status.temp === null) {
+      // no reading from the thermocouple
+      temp.innerHTML = "Temperature: FAULT";
+      temp.style.color = "red";
+   } else {
+      temp.innerHTML = "Temperature: " + round(status.temp, 0) + '°C';
+      temp.style.color = "";
+   }
+   document.getElementById("target").innerHTML = "Target: " + reading(status.target, 0, '°C');
+   document.getElementById("current").innerHTML = "Current: " + reading(status.current, 1, 'A');
+   document.getElementById("duty").innerHTML = "Duty: " + reading(status.duty === null ? null : status.duty * 100, 1, '%');
+   document.getElementById("p").innerHTML = "P: " + reading(status.p, 3, '');
+   document.getElementById("i").innerHTML = "I: " + reading(status.i, 3, '');
+   document.getElementById("d").innerHTML = "D: " + reading(status.d, 3, '');
 
    const runtimeString = toTime(status.runtime);
    document.getElementById("runtime").innerHTML = `Runtime: ${runtimeString}`;
@@ -729,31 +867,53 @@ function traverseFileTree(entry, path = "", cb) {
    }
 }
 
+/**
+   * @brief  CRC32 (IEEE) of a buffer, as the server computes it
+   * @param  {ArrayBuffer} buffer: The data
+   * @return {string} The CRC32 in hex
+   */
+function crc32(buffer) {
+   let crc = 0xFFFFFFFF;
+   for (const byte of new Uint8Array(buffer)) {
+      crc ^= byte;
+      for (let i = 0; i < 8; i++) {
+         crc = (crc >>> 1) ^ (0xEDB88320 & -(crc & 1));
+      }
+   }
+   return ((crc ^ 0xFFFFFFFF) >>> 0).toString(16).padStart(8, "0");
+}
+
 /**
    * @brief  Upload a file to the server
    * @param  {File} file: The file to upload
    * @param  {string} path: The path to the file
    * @return None
    */
-function fileUploader(file, path = file.name) {
+async function fileUploader(file, path = file.name) {
    const url = '/upload';
-   fetch(url, {
-      method: 'POST',
-      body: file,
-      headers: {
-         'Content-Type': 'application/octet-stream',
-         'Content-Disposition': `attachment; filename="${path}"`,
-      },
-   }).then(res => {
+   try {
+      // the server only replaces the file if the checksum matches
+      const data = await file.arrayBuffer();
+      const res = await fetch(url, {
+         method: 'POST',
+         body: data,
+         headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Disposition': `attachment; filename="${path}"`,
+            'X-Content-CRC32': crc32(data),
+         },
+      });
       if (res.ok) {
+         const result = await res.json();
+         console.log(`Uploaded ${path}: ${result.size} bytes at ${result.kbps} KB/s`);
          setStatus("File uploaded", "green");
       } else {
-         setStatus("Error uploading file", "red");
+         setStatus("Error uploading file: " + await res.text(), "red");
       }
-   }).catch(error => {
+   } catch (error) {
       console.error('Error uploading file:', error);
       setStatus("Error uploading file", "red");
-   });
+   }
 }
 
 /**
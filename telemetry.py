@@ -0,0 +1,101 @@
+import struct
+
+# Binary telemetry frame, little endian:
+#   version u8, flags u8 (bit0 running, bit1 paused), field mask u8,
+#   then an f32 (None -> NaN) for every FIELDS entry set in the mask
+VERSION = 2
+HEADER = "<BBB"
+HEADER_SIZE = struct.calcsize(HEADER)
+FULL = "<BBB8f"
+SIZE = struct.calcsize(FULL)
+RUNNING = 0x01
+PAUSED = 0x02
+NAN = float("nan")
+
+FIELDS = ("runtime", "temp", "target", "duty", "current", "p", "i", "d")
+KEYS = FIELDS + ("running", "paused")
+ALL_FIELDS = 0xFF
+ALL_KEYS = (1 << len(KEYS)) - 1
+
+
+def number(value) -> float:
+    return NAN if value is None else value
+
+
+def diff(info: dict, last: dict) -> int:
+    """Bitmask of KEYS whose value differs from `last`, which is updated"""
+    mask = 0
+    for bit in range(len(KEYS)):
+        key = KEYS[bit]
+        value = info[key]
+        if key not in last or last[key] != value:
+            mask |= 1 << bit
+            last[key] = value
+    return mask
+
+
+def select(info: dict, mask: int) -> dict:
+    """The subset of info selected by a diff() mask"""
+    data = {}
+    for bit in range(len(KEYS)):
+        if mask & (1 << bit):
+            data[KEYS[bit]] = info[KEYS[bit]]
+    return data
+
+
+class BinaryEncoder:
+    """Packs Controller.info() into a binary frame"""
+
+    def __init__(self):
+        self.buffer = bytearray(SIZE)
+
+    def encode(self, info: dict, mask: int = ALL_FIELDS) -> bytes:
+        flags = 0
+        if info["running"]:
+            flags |= RUNNING
+        if info["paused"]:
+            flags |= PAUSED
+        mask &= ALL_FIELDS
+        if mask == ALL_FIELDS:
+            struct.pack_into(
+                FULL,
+                self.buffer,
+                0,
+                VERSION,
+                flags,
+                mask,
+                number(info["runtime"]),
+                number(info["temp"]),
+                number(info["target"]),
+                number(info["duty"]),
+                number(info["current"]),
+                number(info["p"]),
+                number(info["i"]),
+                number(info["d"]),
+            )
+            size = SIZE
+        else:
+            struct.pack_into(HEADER, self.buffer, 0, VERSION, flags, mask)
+            size = HEADER_SIZE
+            for bit in range(len(FIELDS)):
+                if mask & (1 << bit):
+                    struct.pack_into("<f", self.buffer, size, number(info[FIELDS[bit]]))
+                    size += 4
+        # the frame sits in client queues after this returns, so it needs
+        # its own immutable copy of the scratch buffer
+        return bytes(memoryview(self.buffer)[:size])
+
+
+def decode(frame) -> dict:
+    """Inverse of BinaryEncoder.encode, mostly for tools and tests"""
+    version, flags, mask = struct.unpack_from(HEADER, frame)
+    if version != VERSION:
+        raise ValueError(f"Unsupported telemetry version {version}")
+    info = {"running": bool(flags & RUNNING), "paused": bool(flags & PAUSED)}
+    offset = HEADER_SIZE
+    for bit in range(len(FIELDS)):
+        if mask & (1 << bit):
+            value = struct.unpack_from("<f", frame, offset)[0]
+            info[FIELDS[bit]] = None if value != value else value
+            offset += 4
+    return info
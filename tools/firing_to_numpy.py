@@ -0,0 +1,60 @@
+"""Decode a firing trace recorded by recorder.py into NumPy arrays.
+
+Usage: python tools/firing_to_numpy.py firings/00003.bin [out.npz]
+
+Runs on CPython only and needs NumPy. Without an output file a short summary is printed.
+"""
+
+import sys
+
+sys.path.insert(0, ".")
+
+import numpy as np  # noqa: E402
+
+from recorder import (  # noqa: E402
+    COLUMNS,
+    HEADER_SIZE,
+    MISSING,
+    SCALES,
+    decode_block,
+    read_header,
+)
+
+
+def load(path: str) -> dict:
+    """Header fields plus one float array per column, NaN where missing"""
+    with open(path, "rb") as file:
+        header = read_header(file)
+        file.seek(HEADER_SIZE)
+        data = file.read()
+
+    block_size = header["block_size"]
+    rows = []
+    for offset in range(0, len(data), block_size):
+        rows.extend(decode_block(data[offset : offset + block_size]))
+
+    raw = np.array(rows, dtype=np.int64).reshape(-1, len(COLUMNS))
+    result = dict(header)
+    for c, column in enumerate(COLUMNS):
+        values = raw[:, c].astype(np.float64)
+        values[raw[:, c] == MISSING] = np.nan
+        result[column] = values / SCALES[c]
+    return result
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 1
+    trace = load(argv[1])
+    if len(argv) > 2:
+        np.savez_compressed(argv[2], **{c: trace[c] for c in COLUMNS})
+        return 0
+    print(f"{trace['name']}: started {trace['start']}, {len(trace['time'])} samples")
+    if len(trace["time"]):
+        print(f"duration {trace['time'][-1]:.1f} s, peak {np.nanmax(trace['temp'])} C")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
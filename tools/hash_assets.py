@@ -0,0 +1,41 @@
+"""Point the static asset URLs of an HTML file at their content hashes.
+
+Usage: python tools/hash_assets.py static/index.html build/static > out.html
+
+Every src="static/NAME" or href="static/NAME" becomes static/NAME?v=HASH, with
+HASH computed by assets.file_hash over the file the device will serve (NAME.gz
+when it exists in the build directory). The server marks requests carrying the
+current hash as immutable, so browsers only revalidate the HTML itself.
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, ".")
+
+from assets import file_hash  # noqa: E402
+
+ATTRIBUTE = re.compile(r'((?:src|href)=")static/([^"?#]+)"')
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    source, build = sys.argv[1:]
+    with open(source) as file:
+        html = file.read()
+
+    def replace(match):
+        name = match.group(2)
+        for path in (f"{build}/{name}.gz", f"{build}/{name}"):
+            if os.path.exists(path):
+                return f'{match.group(1)}static/{name}?v={file_hash(path)}"'
+        return match.group(0)
+
+    sys.stdout.write(ATTRIBUTE.sub(replace, html))
+
+
+if __name__ == "__main__":
+    main()
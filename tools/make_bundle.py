@@ -0,0 +1,66 @@
+"""Pack the build tree into a bundle for the /bundle endpoint.
+
+Usage: python tools/make_bundle.py build bundle.tar.gz
+
+The bundle is a ustar archive of every file under the build directory,
+preceded by a manifest of their sizes and SHA-256 hashes, gzipped with the
+small deflate window bundle.py decompresses with on the device.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import zlib
+
+sys.path.insert(0, ".")
+
+from bundle import MANIFEST, WBITS  # noqa: E402
+
+
+def add(archive: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = 0  # the same build gives the same bundle
+    archive.addfile(info, io.BytesIO(data))
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    build, output = sys.argv[1:]
+    files = {}
+    for root, dirs, names in os.walk(build):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            with open(path, "rb") as file:
+                files[os.path.relpath(path, build).replace(os.sep, "/")] = file.read()
+
+    manifest = {
+        "files": {
+            name: [len(data), hashlib.sha256(data).hexdigest()]
+            for name, data in files.items()
+        }
+    }
+    tar = io.BytesIO()
+    with tarfile.open(fileobj=tar, mode="w", format=tarfile.USTAR_FORMAT) as archive:
+        add(archive, MANIFEST, json.dumps(manifest).encode())
+        for name, data in files.items():
+            add(archive, name, data)
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + WBITS)
+    data = compressor.compress(tar.getvalue()) + compressor.flush()
+    with open(output, "wb") as file:
+        file.write(data)
+    print(
+        f"{output}: {len(files)} files, {len(tar.getvalue())} bytes, "
+        f"{len(data)} gzipped, sha256 {hashlib.sha256(data).hexdigest()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
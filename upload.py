@@ -0,0 +1,106 @@
+import binascii
+import hashlib
+import os
+from logger import Logger
+from utils import millis
+
+log = Logger(__name__)
+
+TEMP_SUFFIX = ".part"
+
+
+class UploadError(ValueError):
+    pass
+
+
+async def readinto(stream, view: memoryview) -> int:
+    """Fill as much of `view` as the stream has ready, 0 at the end"""
+    if hasattr(stream, "readinto"):
+        return await stream.readinto(view) or 0
+    # CPython's StreamReader has no readinto()
+    data = await stream.read(len(view))
+    view[: len(data)] = data
+    return len(data)
+
+
+def replace(source: str, destination: str):
+    """Rename `source` over `destination`"""
+    try:
+        os.rename(source, destination)
+    except OSError:
+        # FAT can't rename over an existing file, the window without either
+        # file is a single directory update
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+class Receiver:
+    """Streams request bodies to files.
+
+    The body goes into a temporary file next to the destination, in chunks
+    of `buffer_size` read into a reusable buffer, and only replaces the
+    destination once all of it arrived and matched the checksums the client
+    sent. An interrupted upload leaves the old file as it was.
+    """
+
+    def __init__(self, buffer_size: int = 2048):
+        self.buffer_size = buffer_size
+        self.buffer = None  # spare buffer, taken by one upload at a time
+
+    def take(self) -> bytearray:
+        buffer, self.buffer = self.buffer, None
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = bytearray(self.buffer_size)
+        return buffer
+
+    def release(self, buffer: bytearray):
+        self.buffer = buffer
+
+    async def receive(
+        self, stream, path: str, size: int, crc32: int = None, sha256: str = None
+    ) -> dict:
+        """Write `size` bytes from `stream` to `path`. Raises UploadError
+        when the body is short or doesn't match `crc32` or `sha256`.
+        """
+        temp = path + TEMP_SUFFIX
+        buffer = self.take()
+        view = memoryview(buffer)
+        crc = 0
+        digest = hashlib.sha256()
+        remaining = size
+        start = millis()
+        try:
+            with open(temp, "wb") as file:
+                while remaining > 0:
+                    n = await readinto(stream, view[: min(remaining, len(buffer))])
+                    if not n:
+                        raise UploadError(f"{size - remaining} of {size} bytes received")
+                    chunk = view[:n]
+                    crc = binascii.crc32(chunk, crc)
+                    digest.update(chunk)
+                    file.write(chunk)
+                    remaining -= n
+            crc &= 0xFFFFFFFF
+            hexdigest = binascii.hexlify(digest.digest()).decode()
+            if crc32 is not None and crc != crc32:
+                raise UploadError(f"CRC32 {crc:08x}, expected {crc32:08x}")
+            if sha256 and hexdigest != sha256.lower():
+                raise UploadError(f"SHA-256 {hexdigest}, expected {sha256}")
+            replace(temp, path)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.release(buffer)
+        ms = max(1, millis() - start)
+        log.info(f"Received {path}: {size} bytes in {ms} ms ({size // ms} KB/s)")
+        return {
+            "size": size,
+            "crc32": f"{crc:08x}",
+            "sha256": hexdigest,
+            "ms": ms,
+            "kbps": size // ms,
+        }
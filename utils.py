@@ -1,12 +1,46 @@
 try:
-    from time import ticks_ms
+    from time import ticks_add, ticks_diff, ticks_ms
 
     def millis():
         return ticks_ms()
 except ImportError:
     from time import time
 
+    # millis() wraps like ticks_ms() on the device, so that code comparing
+    # times with ticks_diff() runs the same here and stays in array("i")
+    TICKS_PERIOD = 1 << 30
     start = int(time() * 1000)
 
     def millis():
-        return int(time() * 1000) - start
+        return (int(time() * 1000) - start) % TICKS_PERIOD
+
+    def ticks_add(ticks: int, delta: int) -> int:
+        return (ticks + delta) % TICKS_PERIOD
+
+    def ticks_diff(end: int, start: int) -> int:
+        half = TICKS_PERIOD // 2
+        return (end - start + half) % TICKS_PERIOD - half
+
+
+def encode_name(name: str, size: int) -> bytes:
+    """`name` as UTF-8 in at most `size` bytes, cut between characters"""
+    data = (name or "").encode()
+    if len(data) > size:
+        # back up to the start of the character the cut would split
+        while size and data[size] & 0xC0 == 0x80:
+            size -= 1
+        data = data[:size]
+    return data
+
+
+def decode_name(data: bytes) -> str:
+    """A name field read back from a record, dropping a character cut in
+    half when it was written (older firmware cut at any byte)
+    """
+    data = data.rstrip(b"\0")
+    for end in range(len(data), max(len(data) - 4, -1), -1):
+        try:
+            return data[:end].decode()
+        except UnicodeError:
+            pass
+    return ""